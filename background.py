@@ -0,0 +1,142 @@
+"""
+Background work that mustn't hold up a frame.
+
+Blocking calls (file writes, launching a browser, ...) are passed to submit(),
+which runs them on a worker thread. Coroutines (telemetry, local sockets, ...)
+are passed to spawn(), which runs them on the game's asyncio event loop if the
+game loop is asyncio-driven, or on a background event loop otherwise.
+
+Completion callbacks are always run on the game thread, at the start of the
+next frame, so they are free to touch gamestates and pygame.
+
+"""
+
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import queue
+import threading
+
+import pygame
+
+"""Event posted to wake up the game loop when background work completes."""
+WAKE_EVENT = pygame.event.custom_type()
+
+# Blocking work is run in order on a single worker, so that e.g. successive
+# writes to the same file can't overtake each other.
+_executor = concurrent.futures.ThreadPoolExecutor(
+    max_workers=1, thread_name_prefix='background')
+
+# Callbacks waiting to be run on the game thread, as (callback, future) pairs.
+_completed = queue.SimpleQueue()
+
+# Outstanding work, so that we can wait for it on exit.
+_pending = set()
+_pending_lock = threading.Lock()
+
+# Event loop used to run coroutines when the game loop isn't asyncio-driven.
+_loop = None
+_loop_lock = threading.Lock()
+
+
+def _running_loop():
+    """Return the asyncio event loop running on this thread, if any."""
+    try:
+        return asyncio.get_running_loop()
+    except RuntimeError:
+        return None
+
+
+def _background_loop():
+    """Return the background event loop, starting it if necessary."""
+    global _loop
+    with _loop_lock:
+        if _loop is None:
+            _loop = asyncio.new_event_loop()
+            threading.Thread(target=_loop.run_forever,
+                             name='background-loop',
+                             daemon=True).start()
+        return _loop
+
+
+def _on_done(callback, future):
+    """Handle completion of a piece of background work."""
+    with _pending_lock:
+        _pending.discard(future)
+
+    if future.cancelled():
+        return
+    elif future.exception() is not None:
+        logging.error('Background work failed',
+                      exc_info=future.exception())
+    elif callback is not None:
+        _completed.put((callback, future))
+        if pygame.display.get_init():
+            pygame.event.post(pygame.event.Event(WAKE_EVENT))
+
+
+def _track(future, callback):
+    """Keep track of a future until it completes."""
+    with _pending_lock:
+        _pending.add(future)
+    future.add_done_callback(functools.partial(_on_done, callback))
+    return future
+
+
+def submit(func, *args, callback=None):
+    """
+    Run func(*args) on a worker thread.
+
+    If a callback is given, it is called on the game thread with the result
+    once the work is done.
+
+    """
+    return _track(_executor.submit(func, *args), callback)
+
+
+def spawn(coro, callback=None):
+    """
+    Run a coroutine without blocking the frame.
+
+    If a callback is given, it is called on the game thread with the result
+    once the coroutine is done.
+
+    """
+    loop = _running_loop()
+    if loop is not None:
+        return _track(loop.create_task(coro), callback)
+    return _track(
+        asyncio.run_coroutine_threadsafe(coro, _background_loop()), callback)
+
+
+def poll():
+    """Run the callbacks for any work that has completed."""
+    while True:
+        try:
+            callback, future = _completed.get_nowait()
+        except queue.Empty:
+            return
+        callback(future.result())
+
+
+async def drain():
+    """Wait for outstanding coroutines on the running event loop."""
+    loop = _running_loop()
+    with _pending_lock:
+        tasks = [f for f in _pending
+                 if isinstance(f, asyncio.Future) and f.get_loop() is loop]
+    if tasks:
+        await asyncio.wait(tasks)
+
+
+def shutdown():
+    """Wait for outstanding work to finish, e.g. on exit."""
+    with _pending_lock:
+        futures = [f for f in _pending
+                   if isinstance(f, concurrent.futures.Future)]
+    concurrent.futures.wait(futures)
+    _executor.shutdown()
+
+    if _loop is not None:
+        _loop.call_soon_threadsafe(_loop.stop)
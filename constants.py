@@ -11,3 +11,34 @@ GAMENAME = "The Terminal"
 VERSION = 0.1
 VERSION_STRING = 'v{}'.format(VERSION)
 MANUAL_URL = 'https://juzley.github.io/game-off-2016/manual.html'
+
+SCREEN_SIZE = (800, 600)
+
+# Default frame rate cap; 0 means run uncapped.
+FPS = 60
+
+# How often to wake up and redraw in on-demand mode while the window is
+# unfocused or minimized.
+IDLE_REDRAW_MS = 1000
+
+# Game logic runs in fixed steps of this many ms, independent of frame rate.
+SIM_STEP_MS = 10
+
+# How often the operator view refreshes the tiles it isn't focused on, at
+# most.
+OPERATOR_REFRESH_MS = 250
+
+# How long the operator view shows a finished game's lost or success screen
+# before restarting it, in ms.
+OPERATOR_RESTART_MS = 3000
+
+# Time the CRT effect may take per frame before it is bypassed, in ms.
+CRT_BUDGET_MS = 4
+
+# How long a frame can run for before the stall watchdog starts sampling it,
+# in ms.
+STALL_THRESHOLD_MS = 100
+
+# The most game time to catch up on in one go, e.g. after the machine has been
+# suspended.
+SIM_MAX_CATCH_UP_MS = 5000
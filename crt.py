@@ -0,0 +1,169 @@
+"""
+CRT post-processing effect.
+
+Adds scanlines, a vignette and a slight bloom on the green text to the glass
+of the terminal, i.e. wherever the bezel is transparent. This needs NumPy,
+which is optional: if it isn't installed, available() returns False and the
+effect can't be used.
+
+"""
+
+import logging
+import time
+
+import pygame
+
+import constants
+from resources import load_image
+
+try:
+    import numpy
+    import pygame.surfarray
+except ImportError:
+    numpy = None
+
+
+def available():
+    """Indicate whether the effect can be used."""
+    return numpy is not None
+
+
+class CRTEffect:
+
+    """
+    Post-processing effect making the screen look like a CRT.
+
+    The effect is applied to the finished frame in place. Everything that
+    depends only on the frame size (the scanlines, vignette and the area
+    covered by the glass) is worked out with NumPy into masks the first time
+    a frame of that size is seen. Each frame then multiplies the frame by the
+    brightness mask and works out the bloom at a reduced resolution, adding
+    it back on with pygame's blend modes.
+
+    If the effect takes longer than its budget for a run of frames, it is
+    bypassed for a while, then tried again.
+
+    """
+
+    # How much the dark scanlines and the corners of the vignette are dimmed
+    # by, out of 256.
+    _SCANLINE_DIM = 70
+    _VIGNETTE_DIM = 110
+
+    # Bloom is worked out at a reduced resolution, spread over a 3x3 block of
+    # reduced pixels, and added at this strength out of 256.
+    _BLOOM_SCALE = 4
+    _BLOOM_STRENGTH = 96
+
+    # The number of consecutive frames over budget before the effect is
+    # bypassed, and the number of frames it is bypassed for.
+    _OVER_BUDGET_LIMIT = 30
+    _BYPASS_FRAMES = 600
+
+    _BEZEL_IMAGE = 'media/bezel.png'
+
+    def __init__(self, budget_ms):
+        """Initialize the class."""
+        self._budget = budget_ms / 1000
+        self._masks = {}
+        self._over_budget = 0
+        self._bypass = 0
+
+    def _get_masks(self, surface):
+        """Get the masks for a frame, creating them if needed."""
+        masks = self._masks.get(surface.get_size())
+        if masks is None:
+            masks = self._create_masks(surface)
+            self._masks[surface.get_size()] = masks
+        return masks
+
+    @staticmethod
+    def _create_masks(surface):
+        """
+        Create the masks for frames the size and format of a given surface.
+
+        Returns a surface holding the brightness to multiply the frame by, the
+        strength of the bloom at the reduced resolution out of 256 (divided
+        by 9 to average each 3x3 block too), and the surfaces used to build
+        the bloom at the reduced and full resolutions.
+
+        """
+        w, h = surface.get_size()
+        scale = CRTEffect._BLOOM_SCALE
+        small_size = ((w + scale - 1) // scale, (h + scale - 1) // scale)
+
+        # The glass is wherever the bezel is transparent.
+        bezel = pygame.transform.smoothscale(
+            load_image(CRTEffect._BEZEL_IMAGE), (w, h))
+        glass = 1 - pygame.surfarray.array_alpha(bezel) / 255
+
+        # Every other line is dimmed, at the resolution of the logical screen
+        # so that the lines scale along with everything else.
+        lines = (numpy.arange(h) * constants.SCREEN_SIZE[1] // h) % 2
+        scanlines = 1 - lines * CRTEffect._SCANLINE_DIM / 256
+
+        # The vignette darkens towards the corners.
+        x = numpy.linspace(-1, 1, w)[:, numpy.newaxis]
+        y = numpy.linspace(-1, 1, h)[numpy.newaxis, :]
+        vignette = 1 - numpy.clip((x ** 2 + y ** 2) / 2, 0, 1) * (
+            CRTEffect._VIGNETTE_DIM / 256)
+
+        brightness = 1 - glass * (1 - scanlines[numpy.newaxis, :] * vignette)
+        brightness = (brightness * 255).astype(numpy.uint8)
+        brightness = pygame.surfarray.make_surface(
+            numpy.dstack((brightness,) * 3)).convert(surface)
+
+        bloom = (glass[::scale, ::scale] * CRTEffect._BLOOM_STRENGTH /
+                 9).astype(numpy.uint16)
+
+        return (brightness, bloom,
+                pygame.Surface(small_size, 0, surface),
+                pygame.Surface((w, h), 0, surface))
+
+    def apply(self, surface):
+        """Apply the effect to a finished frame."""
+        if self._bypass > 0:
+            self._bypass -= 1
+            return
+
+        start = time.perf_counter()
+        brightness, bloom_mask, small, glow = self._get_masks(surface)
+
+        # Sum the green channel over 3x3 blocks at the reduced resolution.
+        scale = CRTEffect._BLOOM_SCALE
+        green = pygame.surfarray.pixels_green(surface)
+        reduced = green[::scale, ::scale].astype(numpy.uint16)
+        del green
+        bloom = reduced.copy()
+        bloom[1:] += reduced[:-1]
+        bloom[:-1] += reduced[1:]
+        reduced = bloom.copy()
+        bloom[:, 1:] += reduced[:, :-1]
+        bloom[:, :-1] += reduced[:, 1:]
+        bloom *= bloom_mask
+        bloom >>= 8
+
+        small_green = pygame.surfarray.pixels_green(small)
+        small_green[...] = bloom
+        del small_green
+        pygame.transform.smoothscale(small, glow.get_size(), glow)
+
+        surface.blit(brightness, (0, 0), special_flags=pygame.BLEND_RGB_MULT)
+        surface.blit(glow, (0, 0), special_flags=pygame.BLEND_RGB_ADD)
+
+        self._check_budget(time.perf_counter() - start)
+
+    def _check_budget(self, elapsed):
+        """Bypass the effect for a while if it's been over budget."""
+        if elapsed <= self._budget:
+            self._over_budget = 0
+            return
+
+        self._over_budget += 1
+        if self._over_budget >= CRTEffect._OVER_BUDGET_LIMIT:
+            logging.warning(
+                'CRT effect over its {:.1f}ms budget ({:.1f}ms), bypassing '
+                'it for {} frames'.format(self._budget * 1000, elapsed * 1000,
+                                          CRTEffect._BYPASS_FRAMES))
+            self._over_budget = 0
+            self._bypass = CRTEffect._BYPASS_FRAMES
@@ -0,0 +1,485 @@
+"""
+The display, and the backends that present frames on it.
+
+Gamestates draw onto a render target passed down to their draw() method. A
+render target has get_surface() to get a surface to draw on, get_rect() for
+the area it covers, and blit_static() to draw surfaces whose contents never
+change once created (images from resources.load_image, text that is rendered
+once and kept), which lets a backend keep them on the GPU. The display
+backends are render targets for the screen, and SurfaceTarget draws offscreen
+instead.
+
+Layout is done against the logical screen, given by get_rect(), whatever the
+render target.
+
+"""
+
+import logging
+import os
+import weakref
+
+import pygame
+import pygame._sdl2
+from pygame._sdl2 import video
+
+import constants
+
+
+class SurfaceBackend:
+
+    """
+    Backend drawing in software onto the pygame display surface.
+
+    This is the default, and supports presenting just the parts of the screen
+    that changed.
+
+    If the window isn't the size of the logical screen, the game is drawn onto
+    a logical screen sized surface instead, which is scaled onto the display
+    surface in one go when the frame is presented, keeping its aspect ratio.
+    Partial presents are only supported with integer scaling, as smooth
+    scaling part of the screen doesn't exactly match scaling all of it.
+
+    In the low-spec profile, the game is drawn onto an 8-bit palettized
+    surface, which is converted to the display format when it's presented.
+    Smooth scaling needs at least 24-bit surfaces, so isn't available then.
+
+    If post_process is set, it's called with the finished frame, scaled to
+    the display, before the frame is presented. Post-processing works on
+    whole frames, so turns off partial presents.
+
+    """
+
+    def __init__(self, vsync, size=None, fullscreen=False, scaling='smooth',
+                 low_spec=False):
+        """Initialize the class, creating the display."""
+        self.low_spec = low_spec
+        self._output = self._set_mode(vsync, size, fullscreen)
+
+        # The area of the display surface that the screen is scaled to.
+        self._output_rect = fit(self._output.get_size(), scaling)
+        self.scaled = self._output_rect.size != constants.SCREEN_SIZE
+
+        self._smooth = scaling == 'smooth' and not low_spec
+        if self.scaled and low_spec and scaling == 'smooth':
+            logging.warning('Smooth scaling is not available in the low-spec '
+                            'profile, scaling without filtering instead')
+        # Scaling only works between surfaces of the same format, so in the
+        # low-spec profile the screen is scaled onto a palettized surface
+        # first, which is then converted onto the display surface.
+        self._scaled_surface = None
+        if low_spec:
+            self._surface = pygame.Surface(constants.SCREEN_SIZE, 0, 8)
+            self._surface.set_palette(_low_spec_palette())
+            if self.scaled:
+                self._scaled_surface = pygame.Surface(self._output_rect.size,
+                                                      0, self._surface)
+        elif self.scaled:
+            self._surface = pygame.Surface(constants.SCREEN_SIZE).convert()
+        else:
+            self._surface = self._output
+        self._output.fill((0, 0, 0))
+
+        whole_multiple = (
+            self._output_rect.w % constants.SCREEN_SIZE[0] == 0 and
+            self._output_rect.h % constants.SCREEN_SIZE[1] == 0)
+        self._partial_updates = not self.scaled or (not self._smooth and
+                                                    whole_multiple)
+        self.post_process = None
+
+    @staticmethod
+    def _set_mode(vsync, size, fullscreen):
+        """Create the display surface."""
+        flags = pygame.DOUBLEBUF | pygame.HWSURFACE
+        if fullscreen:
+            flags |= pygame.FULLSCREEN
+            size = (0, 0)
+        elif size is None:
+            size = constants.SCREEN_SIZE
+
+        if vsync:
+            # SDL only honours vsync for renderer-backed displays, so ask for
+            # a scaled display, which is backed by a renderer. Scaled
+            # displays can't be given a size of (0, 0) to fill the screen,
+            # so ask for the desktop's size instead.
+            scaled_size = size
+            if fullscreen:
+                scaled_size = pygame.display.get_desktop_sizes()[0]
+            try:
+                return pygame.display.set_mode(scaled_size,
+                                               flags | pygame.SCALED, 24,
+                                               vsync=1)
+            except pygame.error as e:
+                logging.warning('Vsync not available ({}), continuing '
+                                'without it'.format(e))
+
+        return pygame.display.set_mode(size, flags, 24)
+
+    @property
+    def partial_updates(self):
+        """Indicate whether part of the screen can be presented on its own."""
+        return self._partial_updates and self.post_process is None
+
+    def to_logical(self, pos):
+        """Map a position on the display to the logical screen."""
+        if not self.scaled:
+            return pos
+        return unscale(pos, self._output_rect)
+
+    @staticmethod
+    def set_caption(caption):
+        """Set the window caption."""
+        pygame.display.set_caption(caption)
+
+    @staticmethod
+    def set_icon(icon):
+        """Set the window icon."""
+        pygame.display.set_icon(icon)
+
+    @staticmethod
+    def convert_alpha(image):
+        """Convert an image with per-pixel alpha for fast drawing."""
+        return image.convert_alpha()
+
+    def get_surface(self):
+        """Get the surface to draw on."""
+        return self._surface
+
+    def get_rect(self):
+        """Get the rect covering the whole screen."""
+        return self._surface.get_rect()
+
+    def blit_static(self, surface, pos):
+        """Draw a surface whose contents never change."""
+        self._surface.blit(surface, pos)
+
+    def begin_frame(self):
+        """Start drawing a new frame."""
+        self._surface.fill((0, 0, 0))
+
+    def present(self, rects=None):
+        """Present the frame, or just the given parts of it."""
+        if self._surface is not self._output:
+            if rects is None:
+                self._scale(self._surface, self._output_rect)
+            else:
+                rects = [self._scale_rect(r) for r in rects]
+
+        if self.post_process is not None and rects is None:
+            self.post_process(self._output.subsurface(self._output_rect))
+
+        if rects is None:
+            pygame.display.flip()
+        else:
+            pygame.display.update(rects)
+
+    def _scale(self, surface, dest_rect):
+        """Scale a surface straight onto part of the display surface."""
+        if surface.get_size() == dest_rect.size:
+            self._output.blit(surface, dest_rect)
+        elif self._smooth:
+            pygame.transform.smoothscale(surface, dest_rect.size,
+                                         self._output.subsurface(dest_rect))
+        elif self._scaled_surface is not None:
+            scaled_rect = dest_rect.move(-self._output_rect.x,
+                                         -self._output_rect.y)
+            pygame.transform.scale(surface, dest_rect.size,
+                                   self._scaled_surface.subsurface(scaled_rect))
+            self._output.blit(self._scaled_surface, dest_rect, scaled_rect)
+        else:
+            pygame.transform.scale(surface, dest_rect.size,
+                                   self._output.subsurface(dest_rect))
+
+    def _scale_rect(self, rect):
+        """Scale part of the screen onto the display surface."""
+        rect = rect.clip(self._surface.get_rect())
+        factor = self._output_rect.w // constants.SCREEN_SIZE[0]
+        dest_rect = pygame.Rect(self._output_rect.x + rect.x * factor,
+                                self._output_rect.y + rect.y * factor,
+                                rect.w * factor, rect.h * factor)
+        if rect.w > 0 and rect.h > 0:
+            self._scale(self._surface.subsurface(rect), dest_rect)
+        return dest_rect
+
+
+class SurfaceTarget:
+
+    """Render target drawing onto an offscreen surface."""
+
+    def __init__(self, surface=None):
+        """Initialize the class, creating a screen sized surface if needed."""
+        if surface is None:
+            surface = pygame.Surface(constants.SCREEN_SIZE)
+        self._surface = surface
+
+    def get_surface(self):
+        """Get the surface to draw on."""
+        return self._surface
+
+    def get_rect(self):
+        """Get the rect covering the whole target."""
+        return self._surface.get_rect()
+
+    def blit_static(self, surface, pos):
+        """Draw a surface whose contents never change."""
+        self._surface.blit(surface, pos)
+
+
+class _Layer:
+
+    """
+    A layer of a frame drawn by the texture backend.
+
+    Each layer is made up of static textures, with anything drawn in software
+    on top of them. The software drawing is done onto a transparent canvas,
+    which is uploaded to a texture when the frame is presented.
+
+    """
+
+    def __init__(self, renderer):
+        """Initialize the class."""
+        self.textures = []
+        self.canvas = pygame.Surface(constants.SCREEN_SIZE, pygame.SRCALPHA,
+                                     32)
+        self.used = False
+        self._texture = video.Texture(
+            renderer, constants.SCREEN_SIZE, streaming=True)
+        self._texture.blend_mode = pygame.BLENDMODE_BLEND
+
+        # The area of the canvas that has been drawn on.
+        self._drawn = None
+
+    def reset(self):
+        """Clear the layer, ready for a new frame."""
+        self.textures = []
+        self.used = False
+        if self._drawn is not None:
+            self.canvas.fill((0, 0, 0, 0), self._drawn)
+            self._drawn = None
+
+    def draw(self):
+        """Draw the layer with the renderer."""
+        for texture, rect in self.textures:
+            texture.draw(dstrect=rect)
+
+        if self.used:
+            # Only upload the part of the canvas that has been drawn on.
+            self._drawn = self.canvas.get_bounding_rect()
+            if self._drawn.w > 0 and self._drawn.h > 0:
+                self._texture.update(self.canvas.subsurface(self._drawn),
+                                     self._drawn)
+                self._texture.draw(srcrect=self._drawn, dstrect=self._drawn)
+
+
+class TextureBackend:
+
+    """
+    Backend compositing frames with SDL's renderer.
+
+    Static surfaces are uploaded to textures the first time they're drawn, and
+    composited by the renderer from then on. Anything else is drawn in
+    software onto transparent canvases, which are uploaded each frame.
+
+    If there's no hardware accelerated renderer, SDL's software renderer is
+    used instead.
+
+    Scaling to the window is left to the renderer, which also maps mouse
+    positions back to the logical screen. Integer scaling uses nearest
+    neighbour filtering, but isn't restricted to whole multiples, as pygame
+    doesn't expose SDL's integer scaling.
+
+    The canvases need per-pixel alpha, so the low-spec profile only affects
+    how the game draws, not the canvas format.
+
+    """
+
+    partial_updates = False
+    scaled = False
+
+    def __init__(self, vsync, size=None, fullscreen=False, scaling='smooth',
+                 low_spec=False):
+        """Initialize the class, creating the window and renderer."""
+        self.low_spec = low_spec
+
+        # SDL picks up the filtering for textures from the environment when
+        # they're created.
+        os.environ['SDL_RENDER_SCALE_QUALITY'] = (
+            'nearest' if scaling == 'integer' else 'linear')
+
+        self._window = video.Window(constants.GAMENAME,
+                                    size=size or constants.SCREEN_SIZE,
+                                    fullscreen_desktop=fullscreen)
+        self._renderer = None
+        for accelerated in (1, 0):
+            try:
+                self._renderer = video.Renderer(self._window,
+                                                accelerated=accelerated,
+                                                vsync=vsync)
+                break
+            except pygame._sdl2.error as e:
+                logging.warning('Could not create {} renderer ({})'.format(
+                    'accelerated' if accelerated else 'software', e))
+        if self._renderer is None:
+            raise pygame._sdl2.error('No renderer available')
+        self._renderer.logical_size = constants.SCREEN_SIZE
+
+        # Textures for static surfaces, dropped when the surface goes away.
+        self._textures = weakref.WeakKeyDictionary()
+
+        # Layers making up the current frame, and layers kept around from
+        # previous frames to save recreating them.
+        self._layers = [_Layer(self._renderer)]
+        self._layer_count = 1
+
+    @staticmethod
+    def to_logical(pos):
+        """Map a position on the display to the logical screen."""
+        return pos
+
+    def set_caption(self, caption):
+        """Set the window caption."""
+        self._window.title = caption
+
+    def set_icon(self, icon):
+        """Set the window icon."""
+        self._window.set_icon(icon)
+
+    def convert_alpha(self, image):
+        """Convert an image with per-pixel alpha for fast drawing."""
+        # There's no display surface to take the format from, so use the
+        # format of the canvases instead. Going through RGBA pixel data makes
+        # sure that the result has per-pixel alpha even if the image didn't,
+        # which converting straight to the canvas format doesn't.
+        rgba = pygame.image.fromstring(pygame.image.tostring(image, 'RGBA'),
+                                       image.get_size(), 'RGBA')
+        return rgba.convert(self._layers[0].canvas)
+
+    def _current_layer(self):
+        """Get the layer currently being drawn."""
+        return self._layers[self._layer_count - 1]
+
+    def get_surface(self):
+        """Get the surface to draw on."""
+        layer = self._current_layer()
+        layer.used = True
+        return layer.canvas
+
+    @staticmethod
+    def get_rect():
+        """Get the rect covering the whole screen."""
+        return pygame.Rect((0, 0), constants.SCREEN_SIZE)
+
+    def blit_static(self, surface, pos):
+        """Draw a surface whose contents never change."""
+        # Textures can't be empty, and there's nothing to draw anyway.
+        if surface.get_width() == 0 or surface.get_height() == 0:
+            return
+
+        # If anything has been drawn in software since the last static surface,
+        # start a new layer, so that this is drawn on top of it.
+        if self._current_layer().used:
+            if self._layer_count == len(self._layers):
+                self._layers.append(_Layer(self._renderer))
+            self._layer_count += 1
+            self._current_layer().reset()
+
+        texture = self._textures.get(surface)
+        if texture is None:
+            texture = video.Texture.from_surface(self._renderer, surface)
+            self._textures[surface] = texture
+        if isinstance(pos, pygame.Rect):
+            pos = pos.topleft
+        self._current_layer().textures.append(
+            (texture, surface.get_rect().move(pos)))
+
+    def begin_frame(self):
+        """Start drawing a new frame."""
+        self._layer_count = 1
+        self._layers[0].reset()
+
+    def present(self, rects=None):
+        """Present the frame."""
+        self._renderer.draw_color = (0, 0, 0, 255)
+        self._renderer.clear()
+        for layer in self._layers[:self._layer_count]:
+            layer.draw()
+        self._renderer.present()
+
+
+def fit(size, scaling='smooth'):
+    """
+    Work out where to draw the screen in an area of the given size.
+
+    The screen is made as large as will fit, keeping its aspect ratio. With
+    integer scaling, it's scaled by a whole number where possible, so that
+    every pixel is the same size.
+
+    """
+    scale = min(size[0] / constants.SCREEN_SIZE[0],
+                size[1] / constants.SCREEN_SIZE[1])
+    if scaling == 'integer' and scale >= 1:
+        scale = int(scale)
+    rect = pygame.Rect(0, 0, int(constants.SCREEN_SIZE[0] * scale),
+                       int(constants.SCREEN_SIZE[1] * scale))
+    rect.center = (size[0] // 2, size[1] // 2)
+    return rect
+
+
+def _low_spec_palette():
+    """
+    Get the palette used for the low-spec profile.
+
+    This is a 6x6x6 colour cube, plus the text colours and a ramp of the
+    terminal green, so that the terminal text is drawn exactly.
+
+    """
+    levels = (0, 51, 102, 153, 204, 255)
+    palette = [(r, g, b) for r in levels for g in levels for b in levels]
+    palette += [constants.TEXT_COLOUR, constants.TEXT_COLOUR_RED]
+    ramp_size = 256 - len(palette)
+    palette += [tuple(c * i // ramp_size for c in constants.TEXT_COLOUR)
+                for i in range(1, ramp_size + 1)]
+    return palette
+
+
+def unscale(pos, rect):
+    """Map a position within a screen scaled to a rect to the logical screen."""
+    return ((pos[0] - rect.x) * constants.SCREEN_SIZE[0] // rect.w,
+            (pos[1] - rect.y) * constants.SCREEN_SIZE[1] // rect.h)
+
+
+"""Backends, by name."""
+BACKENDS = {
+    'surface': SurfaceBackend,
+    'texture': TextureBackend,
+}
+
+"""Ways of scaling the screen to fit the display."""
+SCALING_MODES = ('integer', 'smooth')
+
+"""The current display backend."""
+current = None
+
+
+def init(backend='surface', vsync=False, size=None, fullscreen=False,
+         scaling='smooth', low_spec=False):
+    """
+    Create the display, using the given backend.
+
+    The display is created at the given size, or fullscreen, and the screen
+    is scaled to fit it. The low-spec profile trades looks for drawing speed
+    on weak machines.
+
+    """
+    global current
+    current = BACKENDS[backend](vsync, size, fullscreen, scaling, low_spec)
+    return current
+
+
+def antialias():
+    """Indicate whether text should be antialiased."""
+    return not current.low_spec
+
+
+def get_rect():
+    """Get the rect covering the logical screen."""
+    return pygame.Rect((0, 0), constants.SCREEN_SIZE)
@@ -0,0 +1,436 @@
+"""The main game loop."""
+
+import asyncio
+import time
+
+import pygame
+
+import background
+import constants
+import display
+import hud
+import memstat
+import metrics
+import profiler
+import startup
+import timer
+import tracing
+import util
+import watchdog
+
+
+class GameLoop:
+
+    """
+    Class driving the event/run/draw cycle of the game.
+
+    In the default mode every frame is drawn, up to the frame rate cap. In
+    on-demand mode frames are only drawn when the current gamestate reports
+    that it has changed, and between changes the loop blocks waiting for input
+    or for the next scheduled change, whichever comes first.
+
+    With dirty rects enabled, only the parts of the screen that the current
+    gamestate reports as changed are redrawn and presented.
+
+    Game logic is decoupled from drawing: each frame, the time that has passed
+    is fed into an accumulator, and the gamestates are run in fixed steps of
+    SIM_STEP_MS of game time until the accumulator is used up. This keeps game
+    timing the same whatever the frame rate.
+
+    Before dispatch, each frame's events are filtered down to the types that
+    the gamestates handle, and runs of mouse motion are collapsed into a
+    single event, so that a flood of motion can't make a frame expensive.
+
+    In low-latency mode, rather than starting each frame as soon as the frame
+    budget allows, the loop waits until just long enough before the end of
+    the budget to handle input and draw, so that input is polled as late as
+    possible before the frame that shows it is presented.
+
+    If a gcmanager.GCManager is given, garbage collections are run in the
+    idle time left at the end of each frame.
+
+    While the frame-time overlay (see the hud module) is shown, and the
+    current gamestate doesn't have fonts busy on another thread, it's drawn
+    over each frame, and told how long the frame took. Frames are run under
+    the profiler module's profiler, so that it can capture them on request,
+    and are reported to the stall watchdog (see the watchdog module) and the
+    metrics server (see the metrics module) if they're running, and to the
+    memstat module for counting surface allocations per frame.
+
+    """
+
+    # Event types that the gamestates handle, or that the loop itself uses.
+    _DISPATCHED_EVENTS = (pygame.QUIT,
+                          pygame.KEYDOWN,
+                          pygame.KEYUP,
+                          pygame.MOUSEBUTTONDOWN,
+                          pygame.MOUSEMOTION,
+                          pygame.ACTIVEEVENT,
+                          pygame.VIDEOEXPOSE)
+
+    # Dispatched event types carrying a mouse position.
+    _MOUSE_EVENTS = (pygame.MOUSEBUTTONDOWN, pygame.MOUSEMOTION)
+
+    # Extra time in seconds allowed on top of the estimated frame time in
+    # low-latency mode, and the rate at which the estimate decays after a
+    # slow frame.
+    _LOW_LATENCY_MARGIN = 0.002
+    _WORK_ESTIMATE_DECAY = 0.98
+
+    # Event types to let into the queue at all. As well as those dispatched,
+    # this includes the events that pygame builds the dispatched events from
+    # (key events take their unicode from TEXTINPUT, and ACTIVEEVENT and
+    # VIDEOEXPOSE are made from window events), and the background work
+    # wake-up event.
+    _ALLOWED_EVENTS = _DISPATCHED_EVENTS + (
+        pygame.TEXTINPUT,
+        pygame.WINDOWSHOWN,
+        pygame.WINDOWHIDDEN,
+        pygame.WINDOWEXPOSED,
+        pygame.WINDOWMINIMIZED,
+        pygame.WINDOWRESTORED,
+        pygame.WINDOWFOCUSGAINED,
+        pygame.WINDOWFOCUSLOST,
+        pygame.WINDOWCLOSE,
+        background.WAKE_EVENT)
+
+    def __init__(self, gamestates, fps, on_demand=False, dirty_rects=False,
+                 low_latency=False, latency=None, gc_manager=None):
+        """
+        Initialize the class.
+
+        If a latency.LatencyTracker is given, input latency is recorded to it.
+
+        """
+        self._gamestates = gamestates
+        self._limiter = timer.FrameLimiter(fps)
+        self._on_demand = on_demand
+        self._dirty_rects = dirty_rects
+        self._low_latency = low_latency
+        self._latency = latency
+        self._gc = gc_manager
+
+        # Time in seconds taken to prepare the last frame, up to the point of
+        # presenting it, and the estimate of how long a frame takes.
+        self._work_time = 0
+        self._work_estimate = 0
+
+        # Time in seconds taken by the last frame to run the gamestates, draw
+        # them and present the result, and whether the frame-time overlay was
+        # shown.
+        self._update_time = 0
+        self._draw_time = 0
+        self._present_time = 0
+        self._hud_shown = False
+
+        # Real time that hasn't yet been simulated.
+        self._accumulator = 0
+        self._last_ticks = pygame.time.get_ticks()
+
+        # Window state, as reported by ACTIVEEVENTs.
+        self._focused = True
+        self._visible = True
+
+        self.running = True
+
+        pygame.event.set_blocked(None)
+        pygame.event.set_allowed(list(self._ALLOWED_EVENTS))
+
+    def run(self):
+        """Run the game loop until the game exits."""
+        while self.running:
+            events = self._poll_events()
+            self._frame_start()
+            with tracing.span('frame'):
+                self._frame(events)
+            self._frame_end()
+            lead = self._lead_time()
+            self._collect_garbage(lead)
+
+            # Sleep away whatever is left of the frame, so that we don't spin
+            # the CPU drawing frames nobody will see.
+            self._limiter.wait(lead)
+
+    async def run_async(self):
+        """
+        Run the game loop as a coroutine until the game exits.
+
+        Waiting between frames is done by yielding to the event loop, so that
+        any coroutines scheduled through the background module get to run.
+
+        """
+        while self.running:
+            events = await self._poll_events_async()
+            self._frame_start()
+            with tracing.span('frame'):
+                self._frame(events)
+            self._frame_end()
+            lead = self._lead_time()
+            self._collect_garbage(lead)
+            await self._limiter.wait_async(lead)
+
+        await background.drain()
+
+    def _frame_start(self):
+        """Tell anything watching the frames that one is starting."""
+        profiler.current.frame_start()
+        if watchdog.current is not None:
+            watchdog.current.frame_start()
+
+    def _frame_end(self):
+        """Tell anything watching the frames that one has ended."""
+        if watchdog.current is not None:
+            watchdog.current.frame_end()
+        profiler.current.frame_end(self._gamestates)
+        memstat.frame_end()
+
+    def _lead_time(self):
+        """Work out how long before the end of the frame to start the next."""
+        if not self._low_latency:
+            return 0
+
+        # Err on the side of the slowest recent frame, as a frame that misses
+        # its deadline costs more latency than starting a little early.
+        self._work_estimate = max(
+            self._work_time,
+            self._work_estimate * GameLoop._WORK_ESTIMATE_DECAY)
+        return self._work_estimate + GameLoop._LOW_LATENCY_MARGIN
+
+    def _collect_garbage(self, lead):
+        """Give the garbage collector the idle time left in this frame."""
+        if self._gc is not None:
+            self._gc.collect_idle(self._limiter.remaining() - lead)
+
+    def _frame(self, events):
+        """Run a single iteration of the game loop."""
+        start = time.perf_counter()
+        queue_depth = len(events)
+        if self._gc is not None:
+            self._gc.frame_start()
+        background.poll()
+        events = self._preprocess_events(events)
+        if self._latency is not None:
+            self._latency.received(events)
+        self._track_window(events)
+        update_start = time.perf_counter()
+        self._simulate(events)
+        self._update_time = time.perf_counter() - update_start
+
+        if any(e.type == pygame.QUIT for e in events) or \
+                self._gamestates.empty():
+            # An empty GameStateManager indicates that the main menu was popped,
+            # and we should exit.
+            self.running = False
+            return
+
+        # Redraw everything when the frame-time overlay is shown or hidden.
+        # It's hidden while fonts are in use on another thread, as it needs
+        # them to render.
+        hud_shown = (hud.current.visible and
+                     not self._gamestates.fonts_busy())
+        if self._hud_shown != hud_shown:
+            self._hud_shown = hud_shown
+            self._gamestates.invalidate()
+
+        presented = False
+        if self._should_draw():
+            presented = self._draw(start)
+        else:
+            self._work_time = time.perf_counter() - start
+
+        if presented and self._hud_shown:
+            hud.current.frame_done(self._update_time, self._draw_time,
+                                   self._present_time,
+                                   time.perf_counter() - start)
+        if metrics.current is not None:
+            metrics.current.frame_done(time.perf_counter() - start, presented,
+                                       queue_depth, self._gamestates)
+
+        if self._latency is not None:
+            self._latency.frame_done(presented)
+        if self._gc is not None:
+            self._gc.frame_end(self._work_time,
+                               1 / (self._limiter.fps or constants.FPS))
+
+    def _simulate(self, events):
+        """Run the gamestates for the time that has passed since last frame."""
+        ticks = pygame.time.get_ticks()
+        self._accumulator = min(self._accumulator + ticks - self._last_ticks,
+                                constants.SIM_MAX_CATCH_UP_MS)
+        self._last_ticks = ticks
+
+        # Catch up on game time first, then handle events in the last step,
+        # so that input is handled at the current game time. If less than a
+        # step of time has passed, still run a zero-length step to handle any
+        # input promptly.
+        steps = self._accumulator // constants.SIM_STEP_MS
+        self._accumulator -= steps * constants.SIM_STEP_MS
+        for _ in range(steps - 1):
+            timer.clock.advance(constants.SIM_STEP_MS)
+            self._gamestates.run([])
+            if self._gamestates.empty():
+                return
+
+        if steps > 0:
+            timer.clock.advance(constants.SIM_STEP_MS)
+        if steps > 0 or events:
+            self._gamestates.run(events)
+
+    def _wait_timeout(self):
+        """
+        Work out how long to wait for events before starting a frame.
+
+        Returns 0 if we shouldn't wait at all, or None to wait indefinitely.
+
+        """
+        idle = not self._focused or not self._visible
+        if not self._on_demand or (self._gamestates.dirty() and not idle):
+            return 0
+
+        timeout = self._gamestates.next_redraw()
+        if idle:
+            # Nobody is looking, so only wake up occasionally to keep the game
+            # logic ticking over.
+            timeout = max(timeout or 0, constants.IDLE_REDRAW_MS)
+        return timeout
+
+    def _poll_events(self):
+        """Get the events for this frame, blocking if there's nothing to do."""
+        timeout = self._wait_timeout()
+        if timeout == 0:
+            return pygame.event.get()
+        elif timeout is None:
+            event = pygame.event.wait()
+        else:
+            event = pygame.event.wait(max(1, timeout))
+
+        events = [] if event.type == pygame.NOEVENT else [event]
+        return events + pygame.event.get()
+
+    async def _poll_events_async(self):
+        """
+        Get the events for this frame, waiting if there's nothing to do.
+
+        Blocking in pygame would hold up the event loop, so instead we yield to
+        it for up to a frame at a time, checking for events in between.
+
+        """
+        timeout = self._wait_timeout()
+        if timeout != 0:
+            loop = asyncio.get_running_loop()
+            deadline = None if timeout is None else loop.time() + timeout / 1000
+            interval = 1 / (self._limiter.fps or constants.FPS)
+            while not pygame.event.peek():
+                if deadline is None:
+                    await asyncio.sleep(interval)
+                elif loop.time() < deadline:
+                    await asyncio.sleep(min(interval, deadline - loop.time()))
+                else:
+                    break
+
+        return pygame.event.get()
+
+    def _preprocess_events(self, events):
+        """
+        Filter and coalesce the events for this frame.
+
+        Events that nothing handles are dropped, and each run of consecutive
+        mouse motion events is replaced with a single event at the latest
+        position. Everything else is kept in order.
+
+        If the screen is scaled to fit the display, mouse positions are mapped
+        back to the logical screen.
+
+        """
+        result = []
+        for e in events:
+            if e.type not in self._DISPATCHED_EVENTS:
+                continue
+
+            if display.current.scaled and e.type in self._MOUSE_EVENTS:
+                e = pygame.event.Event(e.type, e.dict,
+                                       pos=display.current.to_logical(e.pos))
+
+            if (e.type == pygame.MOUSEMOTION and result and
+                    result[-1].type == pygame.MOUSEMOTION):
+                prev = result[-1]
+                rel = (prev.rel[0] + e.rel[0], prev.rel[1] + e.rel[1])
+                result[-1] = pygame.event.Event(e.type, e.dict, rel=rel)
+            else:
+                result.append(e)
+
+        return result
+
+    def _track_window(self, events):
+        """Keep track of whether the window is focused and visible."""
+        for e in events:
+            if e.type == pygame.ACTIVEEVENT:
+                active_event = util.ActiveEvent(e.state, e.gain)
+                if active_event.input_focus_change:
+                    self._focused = active_event.gained
+                if active_event.app_active_change:
+                    self._visible = active_event.gained
+                    self._gamestates.invalidate()
+            elif e.type == pygame.VIDEOEXPOSE:
+                self._gamestates.invalidate()
+
+    def _draw(self, frame_start):
+        """
+        Draw the current gamestate and present it.
+
+        Returns whether anything was presented.
+
+        """
+        rects = None
+        if self._dirty_rects and display.current.partial_updates:
+            rects = self._gamestates.dirty_rects()
+            if rects is not None and self._hud_shown:
+                rects = rects + [hud.current.rect()]
+
+        if rects is None:
+            display.current.begin_frame()
+            self._draw_gamestates()
+            self._work_time = time.perf_counter() - frame_start
+            self._present()
+            startup.presented()
+            return True
+        else:
+            screen = display.current.get_surface()
+
+            # Redraw everything, but clipped to the changed area so that
+            # everything outside of it is cheap to skip. We still draw if
+            # nothing changed, so that the gamestate knows what is on screen.
+            if rects:
+                screen.set_clip(rects[0].unionall(rects[1:]))
+            else:
+                screen.set_clip(pygame.Rect(0, 0, 0, 0))
+            screen.fill((0, 0, 0))
+            self._draw_gamestates()
+            screen.set_clip(None)
+            self._work_time = time.perf_counter() - frame_start
+            if not rects:
+                return False
+            self._present(rects)
+            startup.presented()
+            return True
+
+    def _draw_gamestates(self):
+        """Draw the current gamestate, and the overlay if it's shown."""
+        draw_start = time.perf_counter()
+        self._gamestates.draw(display.current)
+        self._draw_time = time.perf_counter() - draw_start
+        if self._hud_shown:
+            hud.current.draw(display.current, self._gamestates)
+
+    def _present(self, rects=None):
+        """Present the frame, or the given rects of it."""
+        present_start = time.perf_counter()
+        with tracing.span('present'):
+            display.current.present(rects)
+        self._present_time = time.perf_counter() - present_start
+
+    def _should_draw(self):
+        """Determine whether to draw this frame."""
+        if not self._visible:
+            return False
+        return not self._on_demand or self._gamestates.dirty()
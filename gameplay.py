@@ -1,19 +1,22 @@
 """Implementation of the core gameplay."""
 
+import logging
 import random
 
 import pygame
 
+import background
 import timer
+import tracing
 import util
 import menu
 import constants
-from gamestate import GameState
+from gamestate import GameState, OverlayState
 from terminal import Terminal
 from resources import load_font
 
 
-class SuccessState(GameState):
+class SuccessState(OverlayState):
 
     """Gamestate implementation for the success screen."""
 
@@ -48,15 +51,41 @@ class SuccessState(GameState):
                                       self._login_text.get_rect().h +
                                       SuccessState._SPACING)
 
-    def draw(self):
-        """Draw the losing screen."""
-        self._terminal.draw_bezel()
-        pygame.display.get_surface().blit(self._login_text,
-                                          self._login_text_coords)
+        # Whether the continue text was shown the last time we drew.
+        self._continue_drawn = None
 
-        if self._timer.time >= SuccessState._WAIT_TIME:
-            pygame.display.get_surface().blit(self._continue_text,
-                                              self._continue_text_coords)
+    def draw_backdrop(self, target, below):
+        """Draw the terminal's bezel behind the text."""
+        self._terminal.draw_bezel(target)
+
+    def draw(self, target):
+        """Draw the losing screen."""
+        target.blit_static(self._login_text, self._login_text_coords)
+
+        self._continue_drawn = self._timer.time >= SuccessState._WAIT_TIME
+        if self._continue_drawn:
+            target.blit_static(self._continue_text,
+                               self._continue_text_coords)
+
+    def dirty(self):
+        """The screen only changes when the continue text appears."""
+        return self._continue_drawn != (self._timer.time >=
+                                        SuccessState._WAIT_TIME)
+
+    def next_redraw(self):
+        """Redraw when it's time to show the continue text."""
+        if self._timer.time < SuccessState._WAIT_TIME:
+            return SuccessState._WAIT_TIME - self._timer.time
+        return None
+
+    def dirty_rects(self):
+        """Only the continue text ever changes."""
+        if self._continue_drawn is None:
+            return None
+        elif self.dirty():
+            return [self._continue_text.get_rect().move(
+                self._continue_text_coords)]
+        return []
 
     def run(self, events):
         """Run the win-game screen."""
@@ -67,7 +96,7 @@ class SuccessState(GameState):
                 self._mgr.pop_until(menu.MainMenu)
 
 
-class LostState(GameState):
+class LostState(OverlayState):
 
     """Gamestate implementation for the defeat screen."""
 
@@ -90,8 +119,9 @@ class LostState(GameState):
 
         font = load_font(LostState._FONT,
                          LostState._CONTINUE_TEXT_HEIGHT)
-        self._continue_text = font.render('Press any key to continue', True,
-                                          constants.TEXT_COLOUR_RED)
+        self._continue_text = font.render(
+            'Press R to retry, or any other key to continue', True,
+            constants.TEXT_COLOUR_RED)
 
         self._login_text_coords = util.center_align(
             self._login_text.get_rect().w,
@@ -102,32 +132,193 @@ class LostState(GameState):
                                       self._login_text.get_rect().h +
                                       LostState._SPACING)
 
-    def draw(self):
-        """Draw the losing screen."""
-        self._terminal.draw_bezel()
-        pygame.display.get_surface().blit(self._login_text,
-                                          self._login_text_coords)
+        # Whether the continue text was shown the last time we drew.
+        self._continue_drawn = None
 
-        if self._timer.time >= LostState._WAIT_TIME:
-            pygame.display.get_surface().blit(self._continue_text,
-                                              self._continue_text_coords)
+    def draw_backdrop(self, target, below):
+        """Draw the terminal's bezel behind the text."""
+        self._terminal.draw_bezel(target)
+
+    def draw(self, target):
+        """Draw the losing screen."""
+        target.blit_static(self._login_text, self._login_text_coords)
+
+        self._continue_drawn = self._timer.time >= LostState._WAIT_TIME
+        if self._continue_drawn:
+            target.blit_static(self._continue_text,
+                               self._continue_text_coords)
+
+    def dirty(self):
+        """The screen only changes when the continue text appears."""
+        return self._continue_drawn != (self._timer.time >=
+                                        LostState._WAIT_TIME)
+
+    def next_redraw(self):
+        """Redraw when it's time to show the continue text."""
+        if self._timer.time < LostState._WAIT_TIME:
+            return LostState._WAIT_TIME - self._timer.time
+        return None
+
+    def dirty_rects(self):
+        """Only the continue text ever changes."""
+        if self._continue_drawn is None:
+            return None
+        elif self.dirty():
+            return [self._continue_text.get_rect().move(
+                self._continue_text_coords)]
+        return []
 
     def run(self, events):
         """Run the lost-game screen."""
         self._timer.update()
         if self._timer.time >= LostState._WAIT_TIME:
-            if len([e for e in events if e.type == pygame.KEYDOWN]) > 0:
+            keys = [e.key for e in events if e.type == pygame.KEYDOWN]
+            if pygame.K_r in keys:
+                # Restart the level by resetting the game underneath, rather
+                # than building it again.
+                self._terminal.reset()
+                self._mgr.pop()
+            elif keys:
                 # Return to the main menu.
                 self._mgr.pop_until(menu.MainMenu)
 
 
+class ConnectingState(GameState):
+
+    """
+    Gamestate shown while the gameplay for a level is built.
+
+    Building the gameplay (the terminal and every program in the level) is
+    slow enough to cause a visible hitch, so it's done on a worker thread
+    while this plays a connecting animation. Once it's ready, it replaces
+    this gamestate.
+
+    Fonts mustn't be used on two threads at once, so until then this reports
+    that fonts are busy, which keeps the frame-time overlay from rendering.
+
+    """
+
+    _TEXT_FONT = constants.TERMINAL_FONT
+    _TEXT_SIZE = constants.TERMINAL_TEXT_SIZE
+    _TEXT_COLOUR = constants.TEXT_COLOUR
+    _TEXT_START = (45, 50)
+
+    # How often another dot is added to the connecting text, and how many
+    # there are before they start again.
+    _DOT_MS = 300
+    _MAX_DOTS = 3
+
+    def __init__(self, mgr, level_info):
+        """Initialize the class, and start building the gameplay."""
+        self._mgr = mgr
+        self._timer = timer.Timer()
+        self._drawn_dots = None
+        self._building = True
+
+        # Render everything up front, as fonts mustn't be used on this thread
+        # while the worker thread may be using them.
+        font = load_font(ConnectingState._TEXT_FONT,
+                         ConnectingState._TEXT_SIZE)
+        host = level_info['cmd'].split()[-1]
+        self._lines = [
+            font.render(text, True, ConnectingState._TEXT_COLOUR)
+            for text in ('$ {}'.format(level_info['cmd']),
+                         'Connecting to {}'.format(host))]
+        self._dot = font.render('.', True, ConnectingState._TEXT_COLOUR)
+        self._dots_pos = (
+            ConnectingState._TEXT_START[0] + self._lines[-1].get_rect().w,
+            ConnectingState._TEXT_START[1] +
+            ConnectingState._TEXT_SIZE * (len(self._lines) - 1))
+        self._bezel = util.render_bezel(constants.VERSION_STRING)
+
+        background.submit(ConnectingState._build, mgr, level_info,
+                          callback=self._on_built)
+
+    @staticmethod
+    def _build(mgr, level_info):
+        """Build the gameplay, called on the worker thread."""
+        try:
+            menu.LevelMenu.resolve_programs(level_info)
+            return GameplayState(mgr, level_info)
+        except Exception:
+            logging.exception('Failed to start level %s', level_info['id'])
+            return None
+
+    def _on_built(self, gameplay):
+        """Swap in the gameplay once it's built."""
+        self._building = False
+        if gameplay is None:
+            self._mgr.pop()
+        else:
+            self._mgr.replace(gameplay)
+
+    def _dots(self):
+        """Get the number of dots currently shown."""
+        return (self._timer.time // ConnectingState._DOT_MS %
+                (ConnectingState._MAX_DOTS + 1))
+
+    def _dots_rect(self):
+        """Get the rect covered by the dots at their longest."""
+        return pygame.Rect(self._dots_pos,
+                           (self._dot.get_rect().w * ConnectingState._MAX_DOTS,
+                            self._dot.get_rect().h))
+
+    def run(self, events):
+        """Run the animation."""
+        self._timer.update()
+
+    def fonts_busy(self):
+        """The worker thread may be using fonts until the gameplay is built."""
+        return self._building
+
+    def draw(self, target):
+        """Draw the connecting text."""
+        for idx, line in enumerate(self._lines):
+            target.blit_static(line, (
+                ConnectingState._TEXT_START[0],
+                ConnectingState._TEXT_START[1] +
+                ConnectingState._TEXT_SIZE * idx))
+
+        self._drawn_dots = self._dots()
+        for idx in range(self._drawn_dots):
+            target.blit_static(self._dot, (
+                self._dots_pos[0] + self._dot.get_rect().w * idx,
+                self._dots_pos[1]))
+
+        target.blit_static(self._bezel, self._bezel.get_rect())
+
+    def dirty(self):
+        """The screen only changes when the number of dots does."""
+        return self._drawn_dots != self._dots()
+
+    def next_redraw(self):
+        """Redraw when the next dot is due."""
+        return ConnectingState._DOT_MS - (self._timer.time %
+                                          ConnectingState._DOT_MS)
+
+    def dirty_rects(self):
+        """Only the dots ever change."""
+        if self._drawn_dots is None:
+            return None
+        elif self.dirty():
+            return [self._dots_rect()]
+        return []
+
+
 class GameplayState(GameState):
 
     """Gamestate implementation for the core gameplay."""
 
-    def __init__(self, mgr, level_info):
-        """Initialize the class."""
+    def __init__(self, mgr, level_info, save_progress=True):
+        """
+        Initialize the class.
+
+        If save_progress is False, completing the level isn't recorded in the
+        player's progress.
+
+        """
         self._level_info = level_info
+        self._save_progress = save_progress
 
         # The level file specifies programs with groups, where each group
         # contains a list of possible programs, and the number of programs to
@@ -197,7 +388,8 @@ class GameplayState(GameState):
                                                                 e.gain))
 
         if not self._terminal.paused:
-            self._terminal.run()
+            with tracing.span('run', self._terminal):
+                self._terminal.run()
 
         # The player is locked out, switch to the Lost gamestate.
         if self._terminal.locked:
@@ -209,9 +401,34 @@ class GameplayState(GameState):
         if self._terminal.completed():
             # Don't need to return to the game, so replace this gamestate with
             # the success screen.
-            menu.LevelMenu.completed_level(self._level_info['id'])
+            if self._save_progress:
+                menu.LevelMenu.completed_level(self._level_info['id'])
             self._mgr.replace(SuccessState(self._mgr, self._terminal))
 
-    def draw(self):
+    def restart(self):
+        """Restart the level, with the same programs but new puzzles."""
+        self._terminal.reset()
+
+    def finished(self):
+        """Indicate whether the level has been lost or completed."""
+        return self._terminal.locked or self._terminal.completed()
+
+    def active_program(self):
+        """Return the program running in the terminal, if any."""
+        return self._terminal.current_program
+
+    def draw(self, target):
         """Draw the game."""
-        self._terminal.draw()
+        self._terminal.draw(target)
+
+    def dirty(self):
+        """Indicate whether the terminal needs to be redrawn."""
+        return self._terminal.dirty()
+
+    def next_redraw(self):
+        """Return the time until the terminal next changes."""
+        return self._terminal.next_redraw()
+
+    def dirty_rects(self):
+        """Return the rects that the terminal has changed."""
+        return self._terminal.dirty_rects()
@@ -1,5 +1,8 @@
 """Module responsible for switching between different gamestates."""
 
+import display
+import tracing
+
 
 class GameState:
 
@@ -9,8 +12,74 @@ class GameState:
         """Run the gamestate."""
         pass
 
-    def draw(self):
-        """Draw the gamestate."""
+    def draw(self, target):
+        """Draw the gamestate onto a render target (see the display module)."""
+
+    def dirty(self):
+        """
+        Indicate whether the gamestate needs to be redrawn.
+
+        Gamestates that don't track their own changes are always redrawn.
+
+        """
+        return True
+
+    def next_redraw(self):
+        """
+        Return the time in ms until the gamestate next changes by itself.
+
+        Returns None if the gamestate only changes in response to input.
+
+        """
+        return None
+
+    def dirty_rects(self):
+        """
+        Return the rects that have changed since the gamestate was last drawn.
+
+        Called just before drawing. Returns None if the whole screen needs to
+        be redrawn, which is the default for gamestates that don't track
+        which parts of the screen they change.
+
+        """
+        return None
+
+    def active_program(self):
+        """Return the terminal program running in the gamestate, if any."""
+        return None
+
+    def fonts_busy(self):
+        """
+        Indicate whether fonts may be in use off the game thread.
+
+        While they are, nothing else may use fonts on the game thread.
+
+        """
+        return False
+
+
+class OverlayState(GameState):
+
+    """
+    Base class for gamestates shown over a backdrop that doesn't change.
+
+    When an overlay is pushed, its backdrop is drawn once onto a snapshot
+    surface, which the GameStateManager draws under the overlay each frame,
+    so the overlay itself only draws its own widgets. The snapshot is dropped
+    when the overlay is popped.
+
+    """
+
+    def draw_backdrop(self, target, below):
+        """
+        Draw the backdrop onto a render target.
+
+        below is the gamestate that the overlay is being pushed over, if any.
+        By default, the backdrop is whatever that gamestate draws.
+
+        """
+        if below is not None:
+            below.draw(target)
 
 
 class GameStateManager:
@@ -24,9 +93,23 @@ class GameStateManager:
         # therefore, is at the end of the list.
         self._states = []
 
+        # Backdrop snapshots for the overlays on the stack.
+        self._backdrops = {}
+
+        # Whether the whole screen needs redrawing regardless of what the
+        # current gamestate thinks, e.g. because the current gamestate changed.
+        self._invalidated = True
+
     def push(self, gamestate):
         """Push a new gamestate onto the stack."""
+        if isinstance(gamestate, OverlayState):
+            target = display.SurfaceTarget()
+            gamestate.draw_backdrop(
+                target, self._states[-1] if self._states else None)
+            self._backdrops[gamestate] = target.get_surface()
+
         self._states.append(gamestate)
+        self._invalidated = True
 
     def replace(self, gamestate):
         """Replace the current gamestate with a new gamestate."""
@@ -36,22 +119,59 @@ class GameStateManager:
     def pop(self):
         """Pop the current gamestate off the stack, and move to the next one."""
         if self._states:
-            self._states.pop()
+            self._backdrops.pop(self._states.pop(), None)
+        self._invalidated = True
 
     def pop_until(self, cls):
         """Pop until the current state is an instance of a given class."""
         while self._states and not isinstance(self._states[-1], cls):
-            self._states.pop()
+            self._backdrops.pop(self._states.pop(), None)
+        self._invalidated = True
 
     def run(self, events):
         """Run the current gamestate."""
         if self._states:
-            self._states[-1].run(events)
+            with tracing.span('run', self._states[-1]):
+                self._states[-1].run(events)
 
-    def draw(self):
-        """Draw the current gamestate."""
+    def draw(self, target):
+        """Draw the current gamestate onto a render target."""
+        if self._states:
+            with tracing.span('draw', self._states[-1]):
+                backdrop = self._backdrops.get(self._states[-1])
+                if backdrop is not None:
+                    target.blit_static(backdrop, (0, 0))
+                self._states[-1].draw(target)
+        self._invalidated = False
+
+    def invalidate(self):
+        """Force the next frame to be redrawn."""
+        self._invalidated = True
+
+    def dirty(self):
+        """Indicate whether the current gamestate needs to be redrawn."""
+        return self._invalidated or (bool(self._states) and
+                                     self._states[-1].dirty())
+
+    def next_redraw(self):
+        """Return the time in ms until the current gamestate next changes."""
         if self._states:
-            self._states[-1].draw()
+            return self._states[-1].next_redraw()
+        return None
+
+    def dirty_rects(self):
+        """Return the rects that the current gamestate has changed."""
+        if self._invalidated or not self._states:
+            return None
+        return self._states[-1].dirty_rects()
+
+    def fonts_busy(self):
+        """Indicate whether the current gamestate has fonts in use."""
+        return bool(self._states) and self._states[-1].fonts_busy()
+
+    def current(self):
+        """Get the current gamestate, or None if there isn't one."""
+        return self._states[-1] if self._states else None
 
     def empty(self):
         """Indicate whether there are any active gamestates."""
@@ -0,0 +1,136 @@
+"""Garbage collector control."""
+
+import gc
+import time
+
+
+class GCManager:
+
+    """
+    Class controlling when the cyclic garbage collector runs.
+
+    Once startup is done, the long-lived objects created by it (fonts,
+    surfaces, puzzles, ...) are frozen so that collections don't keep scanning
+    them. Automatic collection is turned off, and the game loop instead asks
+    for collections in the idle time at the end of a frame, when there's
+    enough of it to fit the collection in.
+
+    GC pauses are timed through gc.callbacks, and frames that overrun their
+    budget are checked against the pauses that happened during them.
+
+    """
+
+    # Collections are put off until there is idle time, but if allocations
+    # run ahead of a generation's threshold by this factor, the collection is
+    # done anyway.
+    _MAX_DEFER_FACTOR = 10
+
+    # Rate at which the estimated pause for a generation decays after a slow
+    # collection.
+    _PAUSE_ESTIMATE_DECAY = 0.9
+
+    def __init__(self):
+        """Initialize the class."""
+        self._thresholds = gc.get_threshold()
+        self._pause_estimates = [0, 0, 0]
+        self._collection_start = None
+        self._in_frame = False
+
+        # Statistics, per generation where applicable.
+        self._collections = [0, 0, 0]
+        self._total_pause = 0
+        self._max_pause = 0
+        self._frame_pause = 0
+        self._dropped_frames = 0
+        self._dropped_with_gc = 0
+        self._idle_collections = 0
+
+    def install(self):
+        """Take control of the garbage collector."""
+        gc.callbacks.append(self._on_gc)
+        gc.disable()
+
+    def uninstall(self):
+        """Hand control of the garbage collector back to Python."""
+        gc.enable()
+        gc.callbacks.remove(self._on_gc)
+
+    @staticmethod
+    def freeze():
+        """
+        Move everything that is currently alive out of the collector's sight.
+
+        This should be done once the long-lived objects have been loaded.
+        Garbage is collected first so that it doesn't get frozen along with
+        everything else.
+
+        """
+        gc.collect()
+        gc.freeze()
+
+    def frame_start(self):
+        """Note that a frame has started."""
+        self._in_frame = True
+        self._frame_pause = 0
+
+    def frame_end(self, frame_time, budget):
+        """
+        Note that a frame has ended.
+
+        frame_time is the time the frame took to prepare, and budget the time
+        it had to do so, in seconds.
+
+        """
+        self._in_frame = False
+        if frame_time > budget:
+            self._dropped_frames += 1
+            if self._frame_pause > 0:
+                self._dropped_with_gc += 1
+
+    def collect_idle(self, idle_time):
+        """Run any collection that is due, if it fits in the idle time."""
+        count = gc.get_count()
+        for generation in (2, 1, 0):
+            if count[generation] >= self._thresholds[generation]:
+                break
+        else:
+            return
+
+        overdue = (count[generation] >=
+                   self._thresholds[generation] * GCManager._MAX_DEFER_FACTOR)
+        if overdue or idle_time > self._pause_estimates[generation]:
+            if not overdue:
+                self._idle_collections += 1
+            gc.collect(generation)
+
+    def _on_gc(self, phase, info):
+        """Time a collection, called through gc.callbacks."""
+        if phase == 'start':
+            self._collection_start = time.perf_counter()
+        elif self._collection_start is not None:
+            pause = time.perf_counter() - self._collection_start
+            self._collection_start = None
+
+            generation = info['generation']
+            self._collections[generation] += 1
+            self._total_pause += pause
+            self._max_pause = max(self._max_pause, pause)
+            self._pause_estimates[generation] = max(
+                pause,
+                self._pause_estimates[generation] *
+                GCManager._PAUSE_ESTIMATE_DECAY)
+            if self._in_frame:
+                self._frame_pause += pause
+
+    def report(self):
+        """Get a summary of the garbage collections that have happened."""
+        return ('GC: {} collections (gen0 {}, gen1 {}, gen2 {}), {} in idle '
+                'time, total pause {:.1f}ms, max pause {:.1f}ms; {} dropped '
+                'frames, {} with a GC pause'.format(
+                    sum(self._collections),
+                    *self._collections,
+                    self._idle_collections,
+                    self._total_pause * 1000,
+                    self._max_pause * 1000,
+                    self._dropped_frames,
+                    self._dropped_with_gc))
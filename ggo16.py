@@ -1,49 +1,249 @@
 """Entry point for the game."""
 
 
-import pygame
+# Imported first, so that the startup trace covers everything else.
+import startup
+
+import argparse
+import asyncio
+import logging
 import random
 
-import constants
-import mouse
-from gamestate import GameStateManager
-from menu import SplashScreen
-from resources import load_image
+with startup.stage('import pygame'):
+    import pygame
+
+with startup.stage('import game modules'):
+    import background
+    import constants
+    import display
+    import hud
+    import memstat
+    import metrics
+    import mouse
+    import profiler
+    import tracing
+    import watchdog
+    from gameloop import GameLoop
+    from gamestate import GameStateManager
+    from gcmanager import GCManager
+    from latency import LatencyTracker
+    from resources import load_image
+
+with startup.stage('import menus'):
+    from menu import SplashScreen
+
+
+def _parse_size(text):
+    """Parse a WIDTHxHEIGHT size argument."""
+    try:
+        width, height = (int(v) for v in text.lower().split('x'))
+    except ValueError:
+        raise argparse.ArgumentTypeError(
+            'invalid size {!r}, expected WIDTHxHEIGHT'.format(text))
+    if width <= 0 or height <= 0:
+        raise argparse.ArgumentTypeError(
+            'invalid size {!r}, must be positive'.format(text))
+    return width, height
+
 
+def parse_args(args=None):
+    """Parse the command line arguments."""
+    parser = argparse.ArgumentParser(description=constants.GAMENAME)
+    parser.add_argument('--fps', type=int, default=constants.FPS,
+                        help='Frame rate cap, 0 to run uncapped '
+                             '(default: %(default)s)')
+    parser.add_argument('--vsync', action='store_true',
+                        help='Synchronize presentation with the display '
+                             'refresh, if supported')
+    parser.add_argument('--renderer', choices=sorted(display.BACKENDS),
+                        default='surface',
+                        help='How to draw the screen: in software onto the '
+                             'display surface, or composited from textures '
+                             'by SDL\'s renderer (default: %(default)s)')
+    parser.add_argument('--window-size', type=_parse_size, default=None,
+                        metavar='WIDTHxHEIGHT',
+                        help='Size of the window, which the screen is scaled '
+                             'to fit (default: {}x{})'.format(
+                                 *constants.SCREEN_SIZE))
+    parser.add_argument('--fullscreen', action='store_true',
+                        help='Run fullscreen, scaling the screen to fit')
+    parser.add_argument('--scaling', choices=display.SCALING_MODES,
+                        default='smooth',
+                        help='How to scale the screen to fit the window: by '
+                             'whole multiples with sharp pixels, or smoothly '
+                             'to fill as much of it as possible '
+                             '(default: %(default)s)')
+    parser.add_argument('--low-spec', action='store_true',
+                        help='Draw with an 8-bit palette and without '
+                             'antialiasing or blending, for weak machines')
+    parser.add_argument('--operator', type=int, default=0, metavar='ROOMS',
+                        help='Watch this many game sessions at once, tiled '
+                             'in one window')
+    parser.add_argument('--operator-level', type=int, default=0,
+                        metavar='ID',
+                        help='Level played in the operator view\'s sessions '
+                             '(default: %(default)s)')
+    parser.add_argument('--operator-refresh-ms', type=int,
+                        default=constants.OPERATOR_REFRESH_MS, metavar='MS',
+                        help='How often the operator view refreshes the tiles '
+                             'it isn\'t focused on, at most '
+                             '(default: %(default)s)')
+    parser.add_argument('--crt', action='store_true',
+                        help='Make the screen look like a CRT (needs NumPy '
+                             'and the surface renderer)')
+    parser.add_argument('--crt-budget-ms', type=float,
+                        default=constants.CRT_BUDGET_MS, metavar='MS',
+                        help='Time the CRT effect may take per frame before '
+                             'it is bypassed (default: %(default)s)')
+    parser.add_argument('--on-demand', action='store_true',
+                        help='Only redraw the screen when something changes')
+    parser.add_argument('--dirty-rects', action='store_true',
+                        help='Only redraw and present the parts of the screen '
+                             'that change')
+    parser.add_argument('--asyncio', action='store_true',
+                        help='Drive the game loop from an asyncio event loop')
+    parser.add_argument('--low-latency', action='store_true',
+                        help='Poll input as late as possible before drawing '
+                             'each frame')
+    parser.add_argument('--latency', action='store_true',
+                        help='Measure input-to-present latency and report it '
+                             'on exit')
+    parser.add_argument('--gc-stats', action='store_true',
+                        help='Report garbage collection pauses and dropped '
+                             'frames on exit')
+    parser.add_argument('--hud', action='store_true',
+                        help='Show the frame rate and frame times over the '
+                             'game (the hidden terminal command hud toggles '
+                             'this too)')
+    parser.add_argument('--profile-frames', type=int, default=0,
+                        metavar='N',
+                        help='Profile the first N frames with cProfile, '
+                             'saving the profile and printing a summary (the '
+                             'hidden terminal command profile N profiles the '
+                             'next N)')
+    parser.add_argument('--trace-spans', action='store_true',
+                        help='Record how long each part of each frame takes, '
+                             'and save it as a Chrome trace on exit (the '
+                             'hidden terminal command trace does this too)')
+    parser.add_argument('--stall-threshold-ms', type=int,
+                        default=constants.STALL_THRESHOLD_MS, metavar='MS',
+                        help='Sample the stack during frames that run longer '
+                             'than this, saving the stacks on exit, or 0 to '
+                             'turn the stall watchdog off '
+                             '(default: %(default)s)')
+    parser.add_argument('--memstat', action='store_true',
+                        help='Count the surfaces allocated each frame by '
+                             'each line of code, and report the top '
+                             'allocators on exit (the hidden terminal '
+                             'command memstat does this too)')
+    parser.add_argument('--metrics-port', type=int, default=0,
+                        metavar='PORT',
+                        help='Serve performance counters for Prometheus at '
+                             'http://127.0.0.1:PORT/metrics')
+    parser.add_argument('--trace-startup', action='store_true',
+                        help='Report the time taken by each stage of startup '
+                             'on exit')
+    return parser.parse_args(args)
 
-def setup():
+
+def setup(options):
     """Perform initial setup."""
-    pygame.init()
-    pygame.display.set_mode([800, 600],
-                            pygame.DOUBLEBUF | pygame.HWSURFACE,
-                            24)
-    pygame.display.set_icon(load_image("media/icon.png"))
-    pygame.display.set_caption(constants.GAMENAME)
-    mouse.current.set_cursor(mouse.Cursor.ARROW)
+    with startup.stage('initialize pygame'):
+        pygame.init()
+    with startup.stage('create display'):
+        display.init(options.renderer, options.vsync, options.window_size,
+                     options.fullscreen, options.scaling, options.low_spec)
+        display.current.set_icon(load_image("media/icon.png"))
+        display.current.set_caption(constants.GAMENAME)
+        mouse.current.set_cursor(mouse.Cursor.ARROW)
+    hud.current.visible = options.hud
+    if options.trace_spans:
+        tracing.enable()
+    if options.memstat:
+        memstat.enable()
+    if options.profile_frames > 0:
+        profiler.current.request(options.profile_frames,
+                                 lambda lines: print('\n'.join(lines)))
+    if options.crt:
+        with startup.stage('set up CRT effect'):
+            setup_crt(options)
     random.seed()
 
 
-def run():
+def setup_crt(options):
+    """Set up the CRT effect, if it can be used."""
+    import crt
+    if not crt.available():
+        logging.warning('The CRT effect needs NumPy, continuing without it')
+    elif options.renderer != 'surface':
+        logging.warning('The CRT effect needs the surface renderer, '
+                        'continuing without it')
+    else:
+        display.current.post_process = crt.CRTEffect(
+            options.crt_budget_ms).apply
+
+
+def run(options):
     """Run the game loop."""
     gamestates = GameStateManager()
-    gamestates.push(SplashScreen(gamestates))
+    if options.operator:
+        with startup.stage('load operator view'):
+            from menu import LevelMenu
+            from operatorview import OperatorState
+            gamestates.push(OperatorState(
+                gamestates, LevelMenu.get_level(options.operator_level),
+                options.operator, options.operator_refresh_ms))
+    else:
+        with startup.stage('load splash screen'):
+            gamestates.push(SplashScreen(gamestates))
+
+    # Everything loaded so far lives for the whole game, so there's no point
+    # in the garbage collector scanning it over and over.
+    gc_manager = GCManager()
+    gc_manager.freeze()
+    gc_manager.install()
+
+    if options.stall_threshold_ms > 0:
+        watchdog.start(options.stall_threshold_ms)
+    if options.metrics_port > 0:
+        metrics.start(options.metrics_port)
+
+    latency = LatencyTracker() if options.latency else None
+    loop = GameLoop(gamestates, options.fps, on_demand=options.on_demand,
+                    dirty_rects=options.dirty_rects,
+                    low_latency=options.low_latency, latency=latency,
+                    gc_manager=gc_manager)
+    if options.asyncio:
+        asyncio.run(loop.run_async())
+    else:
+        loop.run()
+    gc_manager.uninstall()
 
-    running = True
-    while running:
-        events = pygame.event.get()
-        gamestates.run(events)
+    # Make sure anything still in flight, like saving progress, finishes.
+    background.shutdown()
 
-        if any(e.type == pygame.QUIT for e in events) or gamestates.empty():
-            # An empty GameStateManager indicates that the main menu was popped,
-            # and we should exit.
-            running = False
-        else:
-            screen = pygame.display.get_surface()
-            screen.fill((0, 0, 0))
-            gamestates.draw()
-            pygame.display.flip()
+    if latency is not None:
+        print(latency.report())
+    if options.gc_stats:
+        print(gc_manager.report())
+    if options.trace_startup:
+        print(startup.report())
+    if metrics.current is not None:
+        metrics.current.stop()
+    if watchdog.current is not None:
+        watchdog.current.stop()
+        if watchdog.current.slow_frames:
+            print(watchdog.current.report())
+            print('Stacks saved to {}'.format(watchdog.StallWatchdog.write(
+                watchdog.current.collapsed(), watchdog.default_filename())))
+    if memstat.enabled():
+        print('\n'.join(memstat.report()))
+    if tracing.enabled():
+        print('Trace saved to {}'.format(
+            tracing.dump(tracing.snapshot(), tracing.default_filename())))
 
 
 if __name__ == '__main__':
-    setup()
-    run()
+    options = parse_args()
+    setup(options)
+    run(options)
@@ -0,0 +1,173 @@
+"""Frame-time overlay."""
+
+import collections
+import time
+
+import pygame
+
+import constants
+import display
+import memstat
+from resources import load_font
+
+
+class FrameHUD:
+
+    """
+    Overlay showing where the time in each frame goes.
+
+    The game loop reports how long each frame spent running the gamestates,
+    drawing them and presenting the result. The overlay shows the frame rate,
+    the average and worst of each of those over the last _HISTORY frames, a
+    histogram of the whole frame times over the same frames, and which
+    gamestate and terminal program are active.
+
+    The overlay is only rendered again every _REFRESH_MS, so that on most
+    frames showing it costs a single blit. Nothing is recorded while it's
+    hidden.
+
+    """
+
+    _HISTORY = 120
+    _REFRESH_MS = 250
+
+    _FONT = constants.TERMINAL_FONT
+    _FONT_SIZE = 12
+    _TEXT_COLOUR = constants.TEXT_COLOUR_WHITE
+    _BAR_COLOUR = constants.TEXT_COLOUR
+    _SLOW_BAR_COLOUR = constants.TEXT_COLOUR_RED
+    _BACKGROUND_COLOUR = (0, 0, 0)
+
+    _WIDTH = 280
+    _MARGIN = 4
+    _TEXT_LINES = 5
+    _HISTOGRAM_HEIGHT = 40
+
+    # The upper edges of the histogram's buckets in ms. There's one more
+    # bucket for anything slower.
+    _BUCKETS = (2, 4, 8, 12, 16, 25, 33)
+
+    def __init__(self):
+        """Initialize the class."""
+        self._visible = False
+
+        # (update, draw, present, total) times in seconds for recent frames,
+        # and the times at which they were presented.
+        self._frames = collections.deque(maxlen=FrameHUD._HISTORY)
+        self._presented = collections.deque(maxlen=FrameHUD._HISTORY)
+
+        # The rendered overlay and when it was rendered.
+        self._surface = None
+        self._rendered_at = None
+
+    @property
+    def visible(self):
+        """Whether the overlay is shown."""
+        return self._visible
+
+    @visible.setter
+    def visible(self, value):
+        """Show or hide the overlay."""
+        if value and not self._visible:
+            self._frames.clear()
+            self._presented.clear()
+            self._rendered_at = None
+        self._visible = value
+
+    @staticmethod
+    def rect():
+        """Get the rect covered by the overlay, in the top right corner."""
+        font = load_font(FrameHUD._FONT, FrameHUD._FONT_SIZE)
+        height = (font.get_linesize() * (FrameHUD._TEXT_LINES + 1) +
+                  FrameHUD._HISTOGRAM_HEIGHT + FrameHUD._MARGIN * 3)
+        screen = display.get_rect()
+        return pygame.Rect(screen.w - FrameHUD._WIDTH - FrameHUD._MARGIN,
+                           FrameHUD._MARGIN, FrameHUD._WIDTH, height)
+
+    def frame_done(self, update, draw, present, total):
+        """Record the times in seconds taken by a presented frame."""
+        self._frames.append((update, draw, present, total))
+        self._presented.append(time.perf_counter())
+
+    def draw(self, target, gamestates):
+        """Draw the overlay, rendering it again if it's due."""
+        now = pygame.time.get_ticks()
+        if (self._rendered_at is None or
+                now - self._rendered_at >= FrameHUD._REFRESH_MS):
+            self._surface = self._render(gamestates)
+            self._rendered_at = now
+        target.blit_static(self._surface, FrameHUD.rect().topleft)
+
+    def _fps(self):
+        """Work out the frame rate over the recent frames."""
+        if len(self._presented) < 2:
+            return 0
+        elapsed = self._presented[-1] - self._presented[0]
+        return (len(self._presented) - 1) / elapsed if elapsed > 0 else 0
+
+    def _render(self, gamestates):
+        """Render the overlay onto a new surface."""
+        font = load_font(FrameHUD._FONT, FrameHUD._FONT_SIZE)
+        rect = FrameHUD.rect()
+        surface = memstat.allocated(pygame.Surface(rect.size))
+        surface.fill(FrameHUD._BACKGROUND_COLOUR)
+
+        if self._frames:
+            columns = list(zip(*self._frames))
+            stats = [(sum(c) * 1000 / len(c), max(c) * 1000) for c in columns]
+        else:
+            stats = [(0, 0)] * 4
+
+        state = gamestates.current()
+        program = state.active_program() if state is not None else None
+        lines = [
+            'FPS {:5.1f}   frame {:5.1f} max {:5.1f}ms'.format(
+                self._fps(), *stats[3]),
+            'update  {:5.1f} max {:5.1f}ms'.format(*stats[0]),
+            'draw    {:5.1f} max {:5.1f}ms'.format(*stats[1]),
+            'present {:5.1f} max {:5.1f}ms'.format(*stats[2]),
+            '{} / {}'.format(
+                type(state).__name__ if state is not None else '-',
+                type(program).__name__ if program is not None else '-'),
+        ]
+
+        x = y = FrameHUD._MARGIN
+        for line in lines:
+            surface.blit(font.render(line, display.antialias(),
+                                     FrameHUD._TEXT_COLOUR), (x, y))
+            y += font.get_linesize()
+
+        self._draw_histogram(surface, font, y + FrameHUD._MARGIN)
+        return surface
+
+    def _draw_histogram(self, surface, font, top):
+        """Draw the histogram of frame times, with its bucket labels."""
+        counts = [0] * (len(FrameHUD._BUCKETS) + 1)
+        for _, _, _, total in self._frames:
+            ms = total * 1000
+            bucket = 0
+            while (bucket < len(FrameHUD._BUCKETS) and
+                   ms > FrameHUD._BUCKETS[bucket]):
+                bucket += 1
+            counts[bucket] += 1
+
+        width = (FrameHUD._WIDTH - FrameHUD._MARGIN * 2) // len(counts)
+        height = FrameHUD._HISTOGRAM_HEIGHT
+        budget = 1000 / constants.FPS
+        labels = ['<{}'.format(b) for b in FrameHUD._BUCKETS] + ['more']
+        for idx, count in enumerate(counts):
+            x = FrameHUD._MARGIN + idx * width
+            bar = int(height * count / max(len(self._frames), 1))
+            slow = idx > 0 and FrameHUD._BUCKETS[idx - 1] >= budget
+            colour = (FrameHUD._SLOW_BAR_COLOUR if slow else
+                      FrameHUD._BAR_COLOUR)
+            if bar:
+                surface.fill(colour, (x + 1, top + height - bar,
+                                      width - 2, bar))
+            surface.blit(font.render(labels[idx], display.antialias(),
+                                     FrameHUD._TEXT_COLOUR),
+                         (x, top + height + FrameHUD._MARGIN))
+
+
+"""The frame-time overlay."""
+current = FrameHUD()
@@ -0,0 +1,70 @@
+"""Input-to-photon latency measurement."""
+
+import collections
+import time
+
+import pygame
+
+
+def percentile(samples, pct):
+    """Return the given percentile of a sequence of samples."""
+    ordered = sorted(samples)
+    if not ordered:
+        return 0
+    index = min(len(ordered) - 1, int(len(ordered) * pct / 100))
+    return ordered[index]
+
+
+class LatencyTracker:
+
+    """
+    Measure the delay between input arriving and its effect being presented.
+
+    Input events are timestamped when the game loop takes them off the queue.
+    Once the frame that handled them has been presented, the time between
+    the two is recorded. If the frame isn't presented, because nothing on
+    screen changed or the window is hidden, the input is dropped instead,
+    since there's nothing for the player to see.
+
+    """
+
+    # Event types that the player expects to see a response to.
+    _INPUT_EVENTS = (pygame.KEYDOWN, pygame.MOUSEBUTTONDOWN)
+
+    # The number of most recent samples to keep.
+    _MAX_SAMPLES = 10000
+
+    _PERCENTILES = (50, 90, 99)
+
+    def __init__(self):
+        """Initialize the class."""
+        self._samples = collections.deque(maxlen=LatencyTracker._MAX_SAMPLES)
+        self._pending = []
+
+    def received(self, events):
+        """Timestamp any input events that have just been received."""
+        now = time.perf_counter()
+        self._pending.extend(now for e in events
+                             if e.type in LatencyTracker._INPUT_EVENTS)
+
+    def frame_done(self, presented):
+        """Record the latency of the input handled by the frame just done."""
+        if presented:
+            now = time.perf_counter()
+            self._samples.extend((now - t) * 1000 for t in self._pending)
+        self._pending = []
+
+    def percentiles(self):
+        """Get the latency percentiles in ms, as (percentile, ms) pairs."""
+        return [(pct, percentile(self._samples, pct))
+                for pct in LatencyTracker._PERCENTILES]
+
+    def report(self):
+        """Get a summary of the latency measurements."""
+        if not self._samples:
+            return 'Input latency: no samples'
+        return 'Input latency over {} inputs: {}, max {:.1f}ms'.format(
+            len(self._samples),
+            ', '.join('p{} {:.1f}ms'.format(pct, ms)
+                      for pct, ms in self.percentiles()),
+            max(self._samples))
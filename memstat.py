@@ -0,0 +1,191 @@
+"""
+Surface allocation and memory accounting.
+
+Code that creates surfaces passes them through allocated(), which while
+accounting is enabled records the surface's size against the line that
+created it. At the end of each frame, the frame's allocations are added to
+the totals for each call site, so that report() can list the sites that
+allocate the most per frame, along with how much the resources module's cache
+of images is holding on to.
+
+The pixels of a surface are allocated by SDL, which tracemalloc can't see,
+hence the explicit accounting. What tracemalloc can see is the memory used by
+Python objects, and python_report() lists the lines whose allocations have
+grown the most since start_python_tracing() was called.
+
+Only surfaces created on the thread that enabled accounting (the game
+thread) are counted. Surfaces built by background work, such as a level being
+loaded, don't belong to any frame, so are left out.
+
+While accounting is disabled, allocated() just returns the surface it's
+given.
+
+"""
+
+import os
+import sys
+import threading
+import tracemalloc
+
+import pygame
+
+import resources
+
+# The number of call sites listed in the reports.
+_TOP_SITES = 8
+
+# The longest a call site's name in the reports can be.
+_MAX_SITE = 44
+
+# Surfaces allocated by each call site in the frame in progress, as
+# [count, bytes] lists, or None if accounting is disabled.
+_frame = None
+
+# The thread whose allocations are recorded.
+_thread_id = None
+
+# Surfaces allocated by each call site over all frames, as [count, bytes,
+# most bytes in one frame] lists, and the number of frames.
+_totals = {}
+_frames = 0
+
+# The snapshot that python_report() compares against.
+_baseline = None
+
+
+def enabled():
+    """Indicate whether surface allocations are being recorded."""
+    return _frame is not None
+
+
+def enable():
+    """Start recording surface allocations, dropping any recorded before."""
+    global _frame, _frames, _thread_id
+    _thread_id = threading.get_ident()
+    _frame = {}
+    _totals.clear()
+    _frames = 0
+
+
+def disable():
+    """Stop recording surface allocations."""
+    global _frame
+    _frame = None
+
+
+def surface_bytes(surface):
+    """Get the number of bytes taken by a surface's pixels."""
+    return surface.get_pitch() * surface.get_height()
+
+
+def allocated(surface):
+    """Record that the caller has created a surface, and return it."""
+    frame = _frame
+    if frame is None or threading.get_ident() != _thread_id:
+        return surface
+
+    caller = sys._getframe(1)
+    site = '{}:{}({})'.format(os.path.basename(caller.f_code.co_filename),
+                              caller.f_lineno, caller.f_code.co_name)
+    counts = frame.get(site)
+    if counts is None:
+        counts = frame[site] = [0, 0]
+    counts[0] += 1
+    counts[1] += surface_bytes(surface)
+    return surface
+
+
+def frame_end():
+    """Add the surfaces allocated by the frame just done to the totals."""
+    global _frame, _frames
+    if _frame is None:
+        return
+
+    # Start a new dict for the next frame rather than clearing this one, in
+    # case anything is still holding on to it.
+    done, _frame = _frame, {}
+    for site, (count, size) in done.items():
+        totals = _totals.get(site)
+        if totals is None:
+            totals = _totals[site] = [0, 0, 0]
+        totals[0] += count
+        totals[1] += size
+        totals[2] = max(totals[2], size)
+    _frames += 1
+
+
+def cache_usage():
+    """
+    Get the memory held by the resources module's cache.
+
+    Returns the number of images, the bytes taken by their pixels and the
+    number of fonts.
+
+    """
+    media = list(resources._media.values())
+    images = [m for m in media if isinstance(m, pygame.Surface)]
+    return (len(images), sum(surface_bytes(i) for i in images),
+            sum(1 for m in media if isinstance(m, pygame.font.Font)))
+
+
+def _short_site(site):
+    """Shorten a call site's name to fit in a report."""
+    if len(site) > _MAX_SITE:
+        return '...' + site[3 - _MAX_SITE:]
+    return site
+
+
+def report():
+    """Get a summary of the surfaces allocated, and of the resource cache."""
+    frames = max(_frames, 1)
+    top = sorted(_totals.items(), key=lambda item: item[1][1],
+                 reverse=True)[:_TOP_SITES]
+    lines = ['Surface allocations over {} frames:'.format(_frames),
+             '  KB/frame  per frame   max KB  call site']
+    for site, (count, size, peak) in top:
+        lines.append('  {:8.1f} {:10.2f} {:8.1f}  {}'.format(
+            size / 1024 / frames, count / frames, peak / 1024,
+            _short_site(site)))
+
+    images, size, fonts = cache_usage()
+    lines.append('Resource cache: {} images in {:.1f}MB, {} fonts'.format(
+        images, size / 1024 / 1024, fonts))
+    return lines
+
+
+def start_python_tracing():
+    """Start tracing Python allocations with tracemalloc, if not already."""
+    global _baseline
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    _baseline = tracemalloc.take_snapshot()
+
+
+def python_tracing():
+    """Indicate whether Python allocations are being traced."""
+    return _baseline is not None and tracemalloc.is_tracing()
+
+
+def python_report():
+    """
+    List the lines whose Python allocations have grown the most.
+
+    Growth is measured from when start_python_tracing() was called. Taking
+    a snapshot can take a while, so this is best run with
+    background.submit().
+
+    """
+    snapshot = tracemalloc.take_snapshot().filter_traces(
+        (tracemalloc.Filter(False, tracemalloc.__file__),))
+    stats = snapshot.compare_to(_baseline, 'lineno')[:_TOP_SITES]
+    current, peak = tracemalloc.get_traced_memory()
+    lines = ['Python allocations traced: {:.0f}KB, peak {:.0f}KB'.format(
+                 current / 1024, peak / 1024),
+             '   KB grown   blocks  line']
+    for stat in stats:
+        frame = stat.traceback[0]
+        lines.append('  {:+9.1f} {:+8}  {}'.format(
+            stat.size_diff / 1024, stat.count_diff, _short_site(
+                '{}:{}'.format(os.path.basename(frame.filename),
+                               frame.lineno))))
+    return lines
@@ -2,10 +2,10 @@
 
 
 import json
+import background
 import programs
 from . import menu
 from enum import Enum, unique
-from gameplay import GameplayState
 from resources import make_path
 
 
@@ -20,18 +20,16 @@ class LevelMenu(menu.CLIMenu):
     _LEVELS_FILE = 'media/levels.json'
     _PROGRESS_FILE = 'progress.json'
 
+    # The level progress, loaded from disk the first time it's needed. This
+    # is kept up to date in memory, as saving happens in the background.
+    _progress = None
+
     def __init__(self, mgr):
         """Initialize the class."""
-        # Load levels from the level file.
-        with open(make_path(LevelMenu._LEVELS_FILE)) as f:
-            self._levels = json.load(f)
-
-            # The program class names are represented in the JSON as strings,
-            # we need to convert them to the corresponding class objects.
-            for lvl in self._levels:
-                for group in lvl['program_groups'].values():
-                    for program_info in group['programs']:
-                        program_info[1] = getattr(programs, program_info[1])
+        # Load levels from the level file. The program classes are looked up
+        # when a level is chosen, so that only the programs it uses get
+        # loaded.
+        self._levels = LevelMenu.load_levels()
 
         # Load progress information.
         progress = LevelMenu._get_progress()
@@ -67,17 +65,54 @@ class LevelMenu(menu.CLIMenu):
 
         super().__init__(mgr, buf)
 
+    @staticmethod
+    def load_levels():
+        """Load the list of levels from the level file."""
+        with open(make_path(LevelMenu._LEVELS_FILE)) as f:
+            return json.load(f)
+
+    @staticmethod
+    def get_level(lvl_id):
+        """Load a level by ID, ready to be played."""
+        for lvl in LevelMenu.load_levels():
+            if lvl['id'] == lvl_id:
+                LevelMenu.resolve_programs(lvl)
+                return lvl
+        raise KeyError(lvl_id)
+
+    @staticmethod
+    def resolve_programs(lvl):
+        """
+        Convert the program class names in a level to class objects.
+
+        The program class names are represented in the JSON as strings, we
+        need to convert them to the corresponding class objects.
+
+        """
+        for group in lvl['program_groups'].values():
+            for program_info in group['programs']:
+                if isinstance(program_info[1], str):
+                    program_info[1] = getattr(programs, program_info[1])
+
     @staticmethod
     def _get_progress():
-        """Load the current level progress from disk."""
-        try:
-            with open(LevelMenu._PROGRESS_FILE, 'r') as f:
-                return json.load(f)
-        except (FileNotFoundError, ValueError):
-            # The file may not be found if this is the first time the game is
-            # played or the user hasn't completed any levels. Also ignore any
-            # JSON parsing errors.
-            return {}
+        """Get the current level progress, loading it from disk if needed."""
+        if LevelMenu._progress is None:
+            try:
+                with open(LevelMenu._PROGRESS_FILE, 'r') as f:
+                    LevelMenu._progress = json.load(f)
+            except (FileNotFoundError, ValueError):
+                # The file may not be found if this is the first time the game
+                # is played or the user hasn't completed any levels. Also
+                # ignore any JSON parsing errors.
+                LevelMenu._progress = {}
+        return LevelMenu._progress
+
+    @staticmethod
+    def _save_progress(data):
+        """Write serialized level progress to disk."""
+        with open(LevelMenu._PROGRESS_FILE, 'w') as f:
+            f.write(data)
 
     @staticmethod
     def completed_level(lvl_id):
@@ -88,8 +123,8 @@ class LevelMenu(menu.CLIMenu):
             completed.append(lvl_id)
         progress['completed'] = completed
 
-        with open(LevelMenu._PROGRESS_FILE, 'w') as f:
-            json.dump(progress, f)
+        # Serialize now, so the background write sees a consistent snapshot.
+        background.submit(LevelMenu._save_progress, json.dumps(progress))
 
     def _on_choose(self, item):
         if item == LevelMenu.Items.BACK:
@@ -98,5 +133,8 @@ class LevelMenu(menu.CLIMenu):
         else:
             # If this isn't an item from enum of items, assume that the user
             # clicked on a level - in this case 'item' contains the index of
-            # the level in the level list.
-            self._mgr.replace(GameplayState(self._mgr, self._levels[item]))
+            # the level in the level list. The gameplay is built, and its
+            # programs loaded, in the background while the connecting screen
+            # is up.
+            from gameplay import ConnectingState
+            self._mgr.replace(ConnectingState(self._mgr, self._levels[item]))
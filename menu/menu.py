@@ -2,6 +2,7 @@
 
 
 import pygame
+import display
 import util
 import mouse
 import constants
@@ -21,12 +22,13 @@ class MenuItem:
         self._pos = pos
 
         font = load_font(constants.TERMINAL_FONT, text_size)
-        self._text = font.render(text, True, colour)
-        self._selected_text = font.render(text, True, selected_colour)
+        self._text = font.render(text, display.antialias(), colour)
+        self._selected_text = font.render(text, display.antialias(),
+                                          selected_colour)
 
         # Handle alignment
         text_width = self._text.get_rect()[2]
-        surface_width = pygame.display.get_surface().get_rect()[2]
+        surface_width = display.get_rect()[2]
         if align == util.Align.LEFT:
             self._pos = (0, self._pos[1])
         elif align == util.Align.CENTER:
@@ -35,18 +37,21 @@ class MenuItem:
         else:
             self._pos = (surface_width - text_width, self._pos[1])
 
+    @property
+    def rect(self):
+        """The area of the screen covered by this menu item."""
+        return self._text.get_rect().move(self._pos)
+
     def collidepoint(self, pos):
         """Determine whether a given point is within this menu item."""
-        return self._text.get_rect().move(self._pos).collidepoint(pos)
+        return self.rect.collidepoint(pos)
 
-    def draw(self, selected):
+    def draw(self, target, selected):
         """Draw the menu item."""
-        screen = pygame.display.get_surface()
-
         if selected:
-            screen.blit(self._selected_text, self._pos)
+            target.blit_static(self._selected_text, self._pos)
         else:
-            screen.blit(self._text, self._pos)
+            target.blit_static(self._text, self._pos)
 
 
 class Menu(GameState):
@@ -62,9 +67,12 @@ class Menu(GameState):
         """Initialize the class."""
         self._items = items
         self._selected_index = 0
+        self._dirty = True
+        self._drawn_index = None
 
     def run(self, events):
         """Handle events."""
+        selected_index = self._selected_index
         for event in events:
             if event.type == pygame.MOUSEBUTTONDOWN:
                 self._on_mouseclick(event)
@@ -73,10 +81,28 @@ class Menu(GameState):
             elif event.type == pygame.MOUSEMOTION:
                 self._on_mousemove(event)
 
-    def draw(self):
+        if self._selected_index != selected_index:
+            self._dirty = True
+
+    def draw(self, target):
         """Draw the menu."""
         for idx, item in enumerate(self._items):
-            item.draw(idx == self._selected_index)
+            item.draw(target, idx == self._selected_index)
+        self._dirty = False
+        self._drawn_index = self._selected_index
+
+    def dirty(self):
+        """The menu only changes when the selection changes."""
+        return self._dirty
+
+    def dirty_rects(self):
+        """Return the previously and newly selected items' rects."""
+        if self._drawn_index is None:
+            return None
+        elif self._drawn_index == self._selected_index:
+            return []
+        return [self._items[self._drawn_index].rect,
+                self._items[self._selected_index].rect]
 
     def _on_keypress(self, event):
         """Handle a keypress."""
@@ -146,11 +172,13 @@ class CLIMenu(GameState):
         self._bezel = util.render_bezel(constants.VERSION_STRING)
         self._font = load_font(CLIMenu._TEXT_FONT, CLIMenu._TEXT_SIZE)
         self._selected_index = 0
+        self._dirty = True
+        self._drawn_index = None
         self._items = []
         self._cmds = {}
 
         # Create a '<' image to mark the selected item.
-        self._select_marker = self._font.render(' <', True,
+        self._select_marker = self._font.render(' <', display.antialias(),
                                                 CLIMenu._TEXT_COLOUR)
         self._buf = []
         y_coord = CLIMenu._TEXT_START[1]
@@ -182,18 +210,20 @@ class CLIMenu(GameState):
                     # item ID to the cmd text
                     if entry.cmd:
                         self._cmds[item] = self._font.render(
-                            entry.cmd, True, CLIMenu._TEXT_COLOUR)
+                            entry.cmd, display.antialias(),
+                            CLIMenu._TEXT_COLOUR)
             else:
                 line = entry
                 item = None
 
-            text = self._font.render(line, True, colour)
+            text = self._font.render(line, display.antialias(), colour)
             self._buf.append((text, (CLIMenu._TEXT_START[0], y_coord), item,
                               disabled))
             y_coord += CLIMenu._TEXT_SIZE
 
     def run(self, events):
         """Handle events."""
+        selected_index = self._selected_index
         for event in events:
             if event.type == pygame.MOUSEBUTTONDOWN:
                 self._on_mouseclick(event)
@@ -202,27 +232,62 @@ class CLIMenu(GameState):
             elif event.type == pygame.KEYDOWN:
                 self._on_keypress(event)
 
-    def draw(self):
+        if self._selected_index != selected_index:
+            self._dirty = True
+
+    def draw(self, target):
         """Draw the menu."""
         selected_item = self._items[self._selected_index]
 
         # Draw the text
         for line, coords, item, disabled in self._buf:
             if line:
-                pygame.display.get_surface().blit(line, coords)
+                target.blit_static(line, coords)
 
             if item == selected_item and self._highlight_selection():
-                pygame.display.get_surface().blit(
+                target.blit_static(
                     self._select_marker,
                     (coords[0] + line.get_rect().w, coords[1]))
 
         # Draw the command string
         if selected_item in self._cmds:
-            pygame.display.get_surface().blit(self._cmds[selected_item],
-                                              CLIMenu._CMD_TEXT_POS)
+            target.blit_static(self._cmds[selected_item],
+                               CLIMenu._CMD_TEXT_POS)
 
         # Draw the bezel
-        pygame.display.get_surface().blit(self._bezel, self._bezel.get_rect())
+        target.blit_static(self._bezel, self._bezel.get_rect())
+
+        self._dirty = False
+        self._drawn_index = self._selected_index
+
+    def dirty(self):
+        """The menu only changes when the selection changes."""
+        return self._dirty
+
+    def dirty_rects(self):
+        """Return the rects of the previous and new selection markers."""
+        if self._drawn_index is None:
+            return None
+        elif self._drawn_index == self._selected_index:
+            return []
+        return (self._selection_rects(self._drawn_index) +
+                self._selection_rects(self._selected_index))
+
+    def _selection_rects(self, index):
+        """Get the rects of the marker and command for a selected item."""
+        selected_item = self._items[index]
+        rects = []
+        if self._highlight_selection():
+            rects.extend(
+                self._select_marker.get_rect().move(
+                    coords[0] + line.get_rect().w, coords[1])
+                for line, coords, item, _ in self._buf
+                if item == selected_item)
+
+        if selected_item in self._cmds:
+            rects.append(self._cmds[selected_item].get_rect().move(
+                CLIMenu._CMD_TEXT_POS))
+        return rects
 
     @staticmethod
     def _highlight_selection():
@@ -3,11 +3,18 @@
 from .menu import Menu, MenuItem
 from .mainmenu import MainMenu
 from enum import Enum, unique
+from gamestate import OverlayState
 
 
-class PauseMenu(Menu):
+class PauseMenu(Menu, OverlayState):
 
-    """Class defining the pause menu."""
+    """
+    Class defining the pause menu.
+
+    The game is paused while the menu is up, so it's shown over a snapshot of
+    the terminal's bezel.
+
+    """
 
     @unique
     class Items(Enum):
@@ -42,13 +49,6 @@ class PauseMenu(Menu):
         elif item.item_id == PauseMenu.Items.QUIT:
             self._mgr.pop_until(MainMenu)
 
-    def run(self, events):
-        """Run the pause gamestate."""
-        # Run the terminal so that the timer updates.
-        self._terminal.run()
-        super().run(events)
-
-    def draw(self):
-        """Draw the menu."""
-        self._terminal.draw_bezel()
-        super().draw()
+    def draw_backdrop(self, target, below):
+        """Draw the terminal's bezel behind the menu."""
+        self._terminal.draw_bezel(target)
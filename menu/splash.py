@@ -2,6 +2,7 @@
 
 import webbrowser
 from enum import Enum, unique
+import background
 import constants
 import timer
 from .menu import CLIMenu, CLIMenuItem
@@ -71,4 +72,5 @@ class SplashScreen(CLIMenu):
 
     def _on_choose(self, item):
         if item == SplashScreen.Items.LAUNCH_MANUAL:
-            webbrowser.open(constants.MANUAL_URL)
+            # Launching the browser can take a while, so don't wait for it.
+            background.submit(webbrowser.open, constants.MANUAL_URL)
@@ -0,0 +1,214 @@
+"""
+Metrics endpoint.
+
+An HTTP server on localhost exposes performance counters in the Prometheus
+text format, for scraping from each running game. The server runs on a thread
+of its own: the game loop only records each frame's numbers, and all the work
+of formatting them is done when a scrape comes in.
+
+"""
+
+import collections
+import functools
+import http.server
+import logging
+import threading
+import time
+
+import pygame
+
+import resources
+from latency import percentile
+
+
+class _Handler(http.server.BaseHTTPRequestHandler):
+
+    """Request handler serving the metrics at /metrics."""
+
+    _CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+    def do_GET(self):
+        """Serve the metrics."""
+        if self.path.split('?')[0] != '/metrics':
+            self.send_error(404)
+            return
+
+        body = self.server.metrics.exposition().encode('utf-8')
+        self.send_response(200)
+        self.send_header('Content-Type', _Handler._CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        """Don't log each scrape."""
+        pass
+
+
+class MetricsServer:
+
+    """
+    Serve the game's performance counters over HTTP.
+
+    The game loop calls frame_done() after each frame with the frame's
+    numbers, which are just stored. When the server is scraped, its thread
+    works out the frame time percentiles over the last _HISTORY frames and
+    the frame rate over the frames presented in the same time, and counts
+    the fonts and surfaces that have been loaded.
+
+    """
+
+    # The number of recent frames to work out the percentiles and frame rate
+    # over.
+    _HISTORY = 1000
+
+    _QUANTILES = (0.5, 0.9, 0.99)
+
+    _PREFIX = 'theterminal_'
+
+    def __init__(self, port):
+        """
+        Initialize the class, and start serving on a port on localhost.
+
+        Raises OSError if the port can't be listened on.
+
+        """
+        # Times in seconds of recent frames, the times at which recent frames
+        # were presented, and the count and total time of all frames, all
+        # protected by the lock.
+        self._lock = threading.Lock()
+        self._frames = collections.deque(maxlen=MetricsServer._HISTORY)
+        self._presented = collections.deque(maxlen=MetricsServer._HISTORY)
+        self._frame_count = 0
+        self._frame_total = 0
+
+        # The number of events taken off the queue by the last frame, and the
+        # names of the active gamestate and program, each replaced whole.
+        self._queue_depth = 0
+        self._active = ('none', 'none')
+
+        self._server = http.server.HTTPServer(('127.0.0.1', port), _Handler)
+        self._server.metrics = self
+        self._thread = threading.Thread(target=self._server.serve_forever,
+                                        name='metrics', daemon=True)
+        self._thread.start()
+
+    @property
+    def port(self):
+        """The port being served on."""
+        return self._server.server_address[1]
+
+    def frame_done(self, elapsed, presented, queue_depth, gamestates):
+        """
+        Record a frame.
+
+        elapsed is the time in seconds the frame took, and queue_depth the
+        number of events it took off the queue.
+
+        """
+        with self._lock:
+            self._frames.append(elapsed)
+            if presented:
+                self._presented.append(time.perf_counter())
+            self._frame_count += 1
+            self._frame_total += elapsed
+
+        self._queue_depth = queue_depth
+        state = gamestates.current()
+        program = state.active_program() if state is not None else None
+        self._active = (type(state).__name__ if state is not None else 'none',
+                        type(program).__name__ if program is not None else
+                        'none')
+
+    def stop(self):
+        """Stop serving."""
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+    @staticmethod
+    def _fps(presented):
+        """Work out the frame rate over some presentation times."""
+        if len(presented) < 2:
+            return 0
+        elapsed = presented[-1] - presented[0]
+        return (len(presented) - 1) / elapsed if elapsed > 0 else 0
+
+    @staticmethod
+    def _media_counts():
+        """Count the fonts and surfaces that have been loaded."""
+        # Take a copy, as the game thread may be loading more.
+        media = list(resources._media.values())
+        fonts = sum(1 for m in media if isinstance(m, pygame.font.Font))
+        surfaces = sum(1 for m in media if isinstance(m, pygame.Surface))
+        return fonts, surfaces
+
+    def exposition(self):
+        """Get the metrics in the Prometheus text format."""
+        with self._lock:
+            frames = list(self._frames)
+            presented = list(self._presented)
+            count, total = self._frame_count, self._frame_total
+        fonts, surfaces = MetricsServer._media_counts()
+        state, program = self._active
+
+        lines = []
+        metric = functools.partial(MetricsServer._metric, lines)
+        metric('frame_time_seconds', 'summary',
+               'Time taken by each frame of the game loop.',
+               [('', [('quantile', q)], percentile(frames, q * 100))
+                for q in MetricsServer._QUANTILES] +
+               [('_sum', None, total), ('_count', None, count)])
+        metric('fps', 'gauge', 'Frames presented per second.',
+               [('', None, MetricsServer._fps(presented))])
+        metric('event_queue_depth', 'gauge',
+               'Events taken off the queue by the last frame.',
+               [('', None, self._queue_depth)])
+        metric('cached_fonts', 'gauge',
+               'Fonts loaded by the resources module.',
+               [('', None, fonts)])
+        metric('cached_surfaces', 'gauge',
+               'Images loaded by the resources module.',
+               [('', None, surfaces)])
+        metric('active', 'gauge', 'The active gamestate and program.',
+               [('', [('state', state), ('program', program)], 1)])
+        return '\n'.join(lines) + '\n'
+
+    @staticmethod
+    def _metric(lines, name, kind, doc, samples):
+        """
+        Add a metric to the exposition.
+
+        samples is a list of (suffix, labels, value) tuples, where labels is
+        a list of (name, value) pairs, or None.
+
+        """
+        name = MetricsServer._PREFIX + name
+        lines.append('# HELP {} {}'.format(name, doc))
+        lines.append('# TYPE {} {}'.format(name, kind))
+        for suffix, labels, value in samples:
+            if labels:
+                labels = '{{{}}}'.format(','.join(
+                    '{}="{}"'.format(k, v) for k, v in labels))
+            lines.append('{}{}{} {}'.format(name, suffix, labels or '',
+                                            value))
+
+
+"""The metrics server, if it has been started."""
+current = None
+
+
+def start(port):
+    """
+    Start the metrics server on a port on localhost.
+
+    Returns the server, or None if it couldn't be started.
+
+    """
+    global current
+    try:
+        current = MetricsServer(port)
+    except OSError as e:
+        logging.warning('Could not serve metrics on port {}: {}'.format(
+            port, e))
+    return current
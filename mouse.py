@@ -28,8 +28,11 @@ _HAND_STRINGS = (  # sized 24x24
   "                        ",
   "                        ",
 )
-_HAND_CURSOR = ((24, 24), (5, 0)) + \
-               pygame.cursors.compile(_HAND_STRINGS, ".", "X")
+
+
+def _compile_hand_cursor():
+    """Build the hand cursor data from its string representation."""
+    return ((24, 24), (5, 0)) + pygame.cursors.compile(_HAND_STRINGS, ".", "X")
 
 
 class Cursor:
@@ -53,17 +56,28 @@ class Mouse:
 
     """Class for tracking and updating cursor."""
 
-    _CURSORS = {
-        Cursor.ARROW: pygame.cursors.arrow,
-        Cursor.HAND: _HAND_CURSOR,
+    # Functions building the data for each cursor. Cursors are only built
+    # the first time they're used, and kept in _cursors after that.
+    _CURSOR_BUILDERS = {
+        Cursor.ARROW: lambda: pygame.cursors.arrow,
+        Cursor.HAND: _compile_hand_cursor,
     }
 
     def __init__(self):
         self._current_cursor = None
+        self._cursors = {}
 
     def set_cursor(self, cursor_num):
         if self._current_cursor != cursor_num:
-            pygame.mouse.set_cursor(*Mouse._CURSORS[cursor_num])
+            if cursor_num not in self._cursors:
+                self._cursors[cursor_num] = \
+                    Mouse._CURSOR_BUILDERS[cursor_num]()
+            try:
+                pygame.mouse.set_cursor(*self._cursors[cursor_num])
+            except pygame.error:
+                # Some video drivers, like the dummy one used for running
+                # headless, don't support cursors at all.
+                pass
             self._current_cursor = cursor_num
 
 
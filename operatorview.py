@@ -0,0 +1,237 @@
+"""Operator view, watching several game sessions in one window."""
+
+import math
+
+import pygame
+
+import constants
+import display
+import timer
+from gameplay import GameplayState
+from gamestate import GameState, GameStateManager
+
+
+class Tile:
+
+    """
+    A single game session, shown scaled down in one tile of the operator view.
+
+    The session is drawn at full size onto an offscreen surface, which is
+    scaled down to the tile's thumbnail. This is only done when the session
+    has changed, and no more often than the tile's refresh interval.
+
+    Once the game has been lost or completed, its lost or success screen is
+    shown for OPERATOR_RESTART_MS, then the game is restarted, as the screen
+    would otherwise wait for a keypress that an unfocused tile never gets.
+    Completing the level in a tile isn't saved to the player's progress.
+
+    """
+
+    def __init__(self, level_info, rect):
+        """Initialize the class."""
+        self.rect = rect
+        self._session = GameStateManager()
+        self._target = display.SurfaceTarget()
+        self._thumbnail = pygame.Surface(rect.size, 0,
+                                         self._target.get_surface())
+        self._refreshed_at = None
+        self._gameplay = GameplayState(self._session, level_info,
+                                       save_progress=False)
+        self._session.push(self._gameplay)
+
+        # The time at which the game was seen to have finished, if it has.
+        self._timer = timer.Timer()
+        self._finished_at = None
+
+    def run(self, events):
+        """Run the session, restarting the game if it has ended."""
+        self._timer.update()
+        self._session.run(events)
+        if self._session.empty():
+            self._restart()
+        elif not self._gameplay.finished():
+            # The player may have retried from the lost screen.
+            self._finished_at = None
+        elif self._finished_at is None:
+            self._finished_at = self._timer.time
+        elif self._restart_wait() <= 0:
+            self._restart()
+
+    def _restart_wait(self):
+        """Return the time in ms until a finished game is restarted."""
+        return self._finished_at + constants.OPERATOR_RESTART_MS - \
+            self._timer.time
+
+    def _restart(self):
+        """Restart the game, dropping whatever screen it ended on."""
+        while not self._session.empty():
+            self._session.pop()
+        self._gameplay.restart()
+        self._session.push(self._gameplay)
+        self._finished_at = None
+
+    def due(self, now, interval):
+        """Indicate whether the thumbnail needs refreshing at a given time."""
+        return (self._refreshed_at is None or
+                (self._session.dirty() and
+                 now - self._refreshed_at >= interval))
+
+    def next_refresh(self, now, interval):
+        """Return the time in ms until the thumbnail next needs refreshing."""
+        if self._refreshed_at is None:
+            return 0
+        elif self._session.dirty():
+            wait = 0
+        else:
+            wait = self._session.next_redraw()
+
+        # A finished game is restarted whether or not anything has changed.
+        if self._finished_at is not None:
+            restart = max(self._restart_wait(), 0)
+            wait = restart if wait is None else min(wait, restart)
+
+        if wait is None:
+            return None
+        return max(wait, self._refreshed_at + interval - now)
+
+    def refresh(self, now):
+        """Redraw the session and scale it down to the thumbnail."""
+        surface = self._target.get_surface()
+        surface.fill((0, 0, 0))
+        self._session.draw(self._target)
+        pygame.transform.smoothscale(surface, self.rect.size, self._thumbnail)
+        self._refreshed_at = now
+
+    def draw(self, target):
+        """Draw the thumbnail."""
+        target.get_surface().blit(self._thumbnail, self.rect)
+
+    def to_session(self, pos):
+        """Map a position within the tile to the session's screen."""
+        return display.unscale(pos, self.rect)
+
+
+class OperatorState(GameState):
+
+    """
+    Gamestate showing several game sessions tiled in one window.
+
+    Every session keeps running, but only the focused one gets input. The
+    focused tile is refreshed whenever its session changes, so that it can be
+    played normally, and the others at most once per refresh interval.
+    Clicking on a tile focuses it, as do page up and page down.
+
+    """
+
+    # Space around each tile, and the width of the border around it.
+    _MARGIN = 4
+    _BORDER = 1
+
+    _BORDER_COLOUR = (60, 60, 60)
+    _FOCUS_COLOUR = constants.TEXT_COLOUR
+
+    def __init__(self, mgr, level_info, count, refresh_ms):
+        """Initialize the class."""
+        self._mgr = mgr
+        self._refresh_ms = refresh_ms
+        self._timer = timer.Timer()
+        self._tiles = [Tile(level_info, rect)
+                       for rect in OperatorState._layout(count)]
+        self._focus = 0
+        self._drawn_focus = None
+
+    @staticmethod
+    def _layout(count):
+        """Work out the rects of the tiles, in a grid filling the screen."""
+        cols = math.ceil(math.sqrt(count))
+        rows = math.ceil(count / cols)
+        screen = display.get_rect()
+        cell_size = (screen.w // cols, screen.h // rows)
+        margin = OperatorState._MARGIN
+        rects = []
+        for idx in range(count):
+            row, col = divmod(idx, cols)
+            rect = display.fit((cell_size[0] - margin * 2,
+                                cell_size[1] - margin * 2))
+            rects.append(rect.move(col * cell_size[0] + margin,
+                                   row * cell_size[1] + margin))
+        return rects
+
+    def _interval(self, idx):
+        """Get the refresh interval of a tile."""
+        return 0 if idx == self._focus else self._refresh_ms
+
+    def _due_tiles(self):
+        """Get the tiles whose thumbnails need refreshing."""
+        return [t for idx, t in enumerate(self._tiles)
+                if t.due(self._timer.time, self._interval(idx))]
+
+    def run(self, events):
+        """Run the sessions, passing input to the focused one."""
+        self._timer.update()
+
+        focused_events = []
+        for e in events:
+            if e.type == pygame.KEYDOWN and e.key in (pygame.K_PAGEUP,
+                                                      pygame.K_PAGEDOWN):
+                step = 1 if e.key == pygame.K_PAGEDOWN else -1
+                self._focus = (self._focus + step) % len(self._tiles)
+            elif e.type in (pygame.MOUSEBUTTONDOWN, pygame.MOUSEMOTION):
+                self._mouse_event(e, focused_events)
+            else:
+                focused_events.append(e)
+
+        for idx, tile in enumerate(self._tiles):
+            tile.run(focused_events if idx == self._focus else [])
+
+    def _mouse_event(self, event, focused_events):
+        """Handle a mouse event, focusing or passing it to a tile."""
+        focused = self._tiles[self._focus]
+        if focused.rect.collidepoint(event.pos):
+            focused_events.append(pygame.event.Event(
+                event.type, event.dict, pos=focused.to_session(event.pos)))
+        elif event.type == pygame.MOUSEBUTTONDOWN:
+            for idx, tile in enumerate(self._tiles):
+                if tile.rect.collidepoint(event.pos):
+                    self._focus = idx
+
+    def draw(self, target):
+        """Draw the tiles, refreshing any that are due."""
+        for tile in self._due_tiles():
+            tile.refresh(self._timer.time)
+
+        surface = target.get_surface()
+        for idx, tile in enumerate(self._tiles):
+            tile.draw(target)
+            colour = (OperatorState._FOCUS_COLOUR if idx == self._focus else
+                      OperatorState._BORDER_COLOUR)
+            pygame.draw.rect(surface, colour, self._border_rect(tile),
+                             OperatorState._BORDER)
+        self._drawn_focus = self._focus
+
+    def _border_rect(self, tile):
+        """Get the rect of the border around a tile."""
+        return tile.rect.inflate(OperatorState._BORDER * 2,
+                                 OperatorState._BORDER * 2)
+
+    def dirty(self):
+        """Indicate whether any tile needs redrawing."""
+        return self._focus != self._drawn_focus or bool(self._due_tiles())
+
+    def next_redraw(self):
+        """Return the time until the next tile needs refreshing."""
+        waits = [t.next_refresh(self._timer.time, self._interval(idx))
+                 for idx, t in enumerate(self._tiles)]
+        waits = [w for w in waits if w is not None]
+        return min(waits) if waits else None
+
+    def dirty_rects(self):
+        """Return the rects of the tiles that need redrawing."""
+        if self._drawn_focus is None:
+            return None
+
+        rects = [self._border_rect(t) for t in self._due_tiles()]
+        if self._focus != self._drawn_focus:
+            rects.extend(self._border_rect(self._tiles[idx])
+                         for idx in (self._focus, self._drawn_focus))
+        return rects
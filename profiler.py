@@ -0,0 +1,163 @@
+"""On-demand profiling of a number of frames."""
+
+import collections
+import cProfile
+import logging
+import os
+import pstats
+import re
+import time
+
+
+class FrameProfiler:
+
+    """
+    Profile a number of frames of the game loop with cProfile.
+
+    Once a capture has been requested, the game loop's next frames are run
+    under the profiler. When enough frames have been captured, the profile is
+    saved to a .prof file named after the program (or if there wasn't one,
+    the gamestate) that was active for most of them, which can be loaded with
+    pstats or a viewer such as snakeviz. A summary of the functions that took
+    the most time is passed to whoever asked for the capture.
+
+    Only the work done in each frame is profiled, not the time spent waiting
+    for the next one.
+
+    """
+
+    # The number of functions listed in the summary.
+    _SUMMARY_FUNCTIONS = 8
+
+    # The longest a function's name in the summary can be.
+    _MAX_NAME = 48
+
+    # How cProfile names built in methods and functions, e.g.
+    # "<method 'blit' of 'pygame.surface.Surface' objects>" and
+    # "<built-in method time.perf_counter>".
+    _BUILTIN_METHOD = re.compile(r"<method '(\w+)' of '(?:[\w.]*\.)?(\w+)' "
+                                 r"objects>")
+    _BUILTIN_FUNCTION = re.compile(r"<built-in method (.+)>")
+
+    def __init__(self):
+        """Initialize the class."""
+        self._profile = None
+        self._frames_left = 0
+        self._callback = None
+
+        # Whether the current frame is being profiled. A capture requested
+        # part way through a frame starts with the next one.
+        self._in_frame = False
+
+        # How many of the captured frames each program or gamestate was
+        # active for.
+        self._active = collections.Counter()
+
+    @property
+    def capturing(self):
+        """Whether a capture is in progress."""
+        return self._profile is not None
+
+    def request(self, frames, callback=None):
+        """
+        Capture the next frames.
+
+        When the capture is done, the callback (if any) is called with a list
+        of lines summarizing it. Returns False if a capture is already in
+        progress.
+
+        """
+        if self.capturing:
+            return False
+
+        self._profile = cProfile.Profile()
+        self._frames_left = frames
+        self._callback = callback
+        self._active.clear()
+        return True
+
+    def frame_start(self):
+        """Start profiling a frame, if a capture is in progress."""
+        if self._profile is not None:
+            self._profile.enable()
+            self._in_frame = True
+
+    def frame_end(self, gamestates):
+        """Stop profiling a frame, finishing the capture if it's done."""
+        if not self._in_frame:
+            return
+
+        self._profile.disable()
+        self._in_frame = False
+        self._active[FrameProfiler._active_name(gamestates)] += 1
+        self._frames_left -= 1
+        if self._frames_left <= 0:
+            self._finish()
+
+    @staticmethod
+    def _active_name(gamestates):
+        """Get the name of the active program, or failing that gamestate."""
+        state = gamestates.current()
+        if state is None:
+            return 'none'
+        program = state.active_program()
+        return type(program if program is not None else state).__name__
+
+    def _finish(self):
+        """Save the capture and summarize it."""
+        profile, self._profile = self._profile, None
+        callback, self._callback = self._callback, None
+        frames = sum(self._active.values())
+        name = self._active.most_common(1)[0][0]
+        filename = 'profile-{}-{}.prof'.format(
+            name, time.strftime('%Y%m%d-%H%M%S'))
+
+        try:
+            profile.dump_stats(filename)
+        except OSError as e:
+            logging.warning('Could not save profile to {}: {}'.format(
+                filename, e))
+            saved = 'Could not save profile: {}'.format(e.strerror)
+        else:
+            saved = 'Saved to {}'.format(os.path.abspath(filename))
+
+        lines = ['Profiled {} frames, mostly in {}.'.format(frames, name),
+                 saved] + FrameProfiler._summarize(profile, frames)
+        if callback is not None:
+            callback(lines)
+
+    @staticmethod
+    def _summarize(profile, frames):
+        """List the functions that took the most time, excluding callees."""
+        stats = pstats.Stats(profile).stats
+        top = sorted(stats.items(), key=lambda item: item[1][2],
+                     reverse=True)[:FrameProfiler._SUMMARY_FUNCTIONS]
+
+        lines = ['  ms/frame    calls  function']
+        for (filename, line, func), (_, calls, own, _, _) in top:
+            if filename == '~':
+                # Built in functions have no file.
+                name = FrameProfiler._builtin_name(func)
+            else:
+                name = '{}:{}({})'.format(os.path.basename(filename), line,
+                                          func)
+            if len(name) > FrameProfiler._MAX_NAME:
+                name = '...' + name[3 - FrameProfiler._MAX_NAME:]
+            lines.append('  {:8.2f} {:8}  {}'.format(own * 1000 / frames,
+                                                     calls, name))
+        return lines
+
+    @staticmethod
+    def _builtin_name(func):
+        """Shorten the name cProfile gives a built in function."""
+        m = FrameProfiler._BUILTIN_METHOD.match(func)
+        if m:
+            return '{}.{}'.format(m.group(2), m.group(1))
+        m = FrameProfiler._BUILTIN_FUNCTION.match(func)
+        if m:
+            return m.group(1)
+        return func
+
+
+"""The frame profiler."""
+current = FrameProfiler()
@@ -1,7 +1,52 @@
-from programs.hardware import HardwareInspect
-from programs.hexedit import HexEditor
-from programs.password import PasswordGuess
-from programs.imagepassword import ImagePassword
-from programs.network import NetworkManager
-from programs.decrypt import Decrypt
-from programs.minehunt import MineHunt
+"""
+Terminal programs.
+
+Program modules are only imported the first time one of their classes is
+looked up, so that nothing is loaded for programs a level doesn't use. The
+imports are written out in full, rather than built from strings, so that
+PyInstaller can still find the modules to bundle.
+
+"""
+
+# The program classes that can be looked up.
+_PROGRAMS = ('HardwareInspect', 'HexEditor', 'PasswordGuess', 'ImagePassword',
+             'NetworkManager', 'Decrypt', 'MineHunt')
+
+
+def _import(name):
+    """Import a program class from its module."""
+    if name == 'HardwareInspect':
+        from programs.hardware import HardwareInspect
+        return HardwareInspect
+    if name == 'HexEditor':
+        from programs.hexedit import HexEditor
+        return HexEditor
+    if name == 'PasswordGuess':
+        from programs.password import PasswordGuess
+        return PasswordGuess
+    if name == 'ImagePassword':
+        from programs.imagepassword import ImagePassword
+        return ImagePassword
+    if name == 'NetworkManager':
+        from programs.network import NetworkManager
+        return NetworkManager
+    if name == 'Decrypt':
+        from programs.decrypt import Decrypt
+        return Decrypt
+    if name == 'MineHunt':
+        from programs.minehunt import MineHunt
+        return MineHunt
+    raise AttributeError(
+        "module 'programs' has no attribute '{}'".format(name))
+
+
+def __getattr__(name):
+    """Import the module containing a program class on first use."""
+    cls = _import(name)
+    globals()[name] = cls
+    return cls
+
+
+def __dir__():
+    """List the program classes, whether or not they're loaded yet."""
+    return sorted(set(globals()) | set(_PROGRAMS))
@@ -51,6 +51,10 @@ class Decrypt(program.TerminalProgram):
         self._enc_string = ""
         self._dec_string = ""
 
+    def reset(self):
+        """Reset the program."""
+        self._correct = False
+
     def start(self):
         """Start the program."""
         self._fontname, self._cypher = random.choice(Decrypt._FONTS)
@@ -3,6 +3,8 @@
 import pygame
 import random
 
+import display
+import memstat
 import mouse
 from . import program
 from resources import load_image, load_font
@@ -201,16 +203,51 @@ class HardwareInspect(program.TerminalProgram):
         """Initialize the class."""
         super().__init__(terminal)
 
+        # The board definition in use, and the board created from it.
+        self._board_def = None
+        self._board = None
+        self._board_pos = None
+
+        # Create the message pointing at the button
+        font = load_font(self._MESSAGE_FONT, self._MESSAGE_SIZE)
+        self._message_text = font.render(self._MESSAGE_TEXT, True,
+                                         self._MESSAGE_COLOUR)
+        self._button_rect = pygame.Rect(self._POWER_BUTTON_RECT)
+
+        self.reset()
+
+    def reset(self):
+        """
+        Reset the program, picking a new board and components.
+
+        The board is only created again if a different board definition is
+        picked.
+
+        """
         # The draw surface
         self._draw_surface = None
 
         # Grab a board definition at random
         board_def = random.choice(BoardDefinition.boards)
+        if board_def is not self._board_def:
+            self._create_board(board_def)
 
         self._component_pairs = self._create_component_pairs(board_def)
 
-        # Create the board
-        self._board = load_image(board_def.filename)
+        self._completed = False
+        self._exited = False
+
+        # The board surface as it was last drawn.
+        self._drawn_surface = None
+
+    def _create_board(self, board_def):
+        """Create the board from a board definition."""
+        self._board_def = board_def
+
+        # Create the board, on a copy of the image so that the static assets
+        # aren't added to the cached image.
+        self._board = memstat.allocated(
+            load_image(board_def.filename).copy())
 
         # Add the static assets
         for filename, pos in board_def.assets:
@@ -218,20 +255,11 @@ class HardwareInspect(program.TerminalProgram):
             self._board.blit(image, pos)
 
         # Set the board position
-        screen_rect = pygame.display.get_surface().get_rect()
+        screen_rect = display.get_rect()
         board_rect = self._board.get_rect()
         self._board_pos = (int((screen_rect[2] / 2) - (board_rect[2] / 2)),
                            self._BOARD_Y)
 
-        # Create the message pointing at the button
-        font = load_font(self._MESSAGE_FONT, self._MESSAGE_SIZE)
-        self._message_text = font.render(self._MESSAGE_TEXT, True,
-                                         self._MESSAGE_COLOUR)
-        self._button_rect = pygame.Rect(self._POWER_BUTTON_RECT)
-
-        self._completed = False
-        self._exited = False
-
     @property
     def help(self):
         """Get the help string for the program."""
@@ -287,16 +315,23 @@ class HardwareInspect(program.TerminalProgram):
                                           "detected. Recovering")
                     self._terminal.reduce_time(10)
 
-    def draw(self):
+    def dirty_rects(self):
+        """Return the board's rect if any components have changed."""
+        if self._draw_surface is self._drawn_surface:
+            return []
+        return [self._draw_surface.get_rect().move(self._board_pos)]
+
+    def draw(self, target):
         """Draw the program."""
-        screen = pygame.display.get_surface()
+        self._drawn_surface = self._draw_surface
+        screen = target.get_surface()
         screen.blit(self._draw_surface, self._board_pos)
 
         # Draw the power off bezel now, so we can then write on it.
-        self._terminal.draw_bezel(power_off=True)
+        self._terminal.draw_bezel(target, power_off=True)
 
         # Draw message text
-        screen.blit(self._message_text, self._MESSAGE_POS)
+        target.blit_static(self._message_text, self._MESSAGE_POS)
 
     def _create_component_pairs(self, board_def):
         component_pairs = []
@@ -322,7 +357,7 @@ class HardwareInspect(program.TerminalProgram):
         return component_pairs
 
     def _setup_draw(self):
-        self._draw_surface = self._board.copy()
+        self._draw_surface = memstat.allocated(self._board.copy())
 
         for pair in self._component_pairs:
             pair.setup_draw(self._draw_surface)
@@ -351,6 +386,7 @@ class Component:
         self.code = code
 
         self._image = None
+        self._disabled_image = None
         self._pos = pos
 
     def toggle(self):
@@ -364,15 +400,14 @@ class Component:
         if self._image is None:
             self.create_image()
 
-        # If disabled, grey out
+        # If disabled, grey out. The greyed out image is made once, by
+        # subtracting the grey straight from a copy of the image.
         if self.disabled:
-            image = self._image.copy()
-            rect = self._image.get_rect()
-            dark = pygame.Surface((rect[2], rect[3]),
-                                  flags=pygame.SRCALPHA)
-            dark.fill((100, 100, 100, 0))
-            image.blit(dark, (0, 0), special_flags=pygame.BLEND_RGBA_SUB)
-            surface.blit(image, self._pos)
+            if self._disabled_image is None:
+                self._disabled_image = memstat.allocated(self._image.copy())
+                self._disabled_image.fill((100, 100, 100),
+                                          special_flags=pygame.BLEND_RGB_SUB)
+            surface.blit(self._disabled_image, self._pos)
         else:
             surface.blit(self._image, self._pos)
 
@@ -399,13 +434,15 @@ class Resistor(Component):
 
     def create_image(self):
         # Take a copy as we are going to edit it!
-        self._image = load_image('media/resistor.png').copy()
+        self._image = memstat.allocated(
+            load_image('media/resistor.png').copy())
 
         # Create a surface to draw the lines on, so we can blend it with the
         # resistor and have it ignore the portions of the lines outside the
         # resistor
         height = self._image.get_rect()[3]
-        surface = pygame.Surface((self._AREA_WIDTH, height))
+        surface = memstat.allocated(
+            pygame.Surface((self._AREA_WIDTH, height)))
         surface.fill((255, 255, 255))
         surface.set_alpha(0)
 
@@ -436,7 +473,8 @@ class Chip(Component):
 
     def create_image(self):
         # Take a copy as we are going to edit it!
-        self._image = load_image('media/chip.png').copy()
+        self._image = memstat.allocated(
+            load_image('media/chip.png').copy())
 
         # Add code to the chip
         font = load_font(self._FONT, self._FONT_SIZE)
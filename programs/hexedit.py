@@ -62,6 +62,11 @@ class HexEditor(program.TerminalProgram):
             return HexEditor._VAL_PROMPT.format(
                 self._start_data[self._row][self._col])
 
+    def reset(self):
+        """Reset the program."""
+        self._completed = False
+        self._state = HexEditor.States.QUERY_ROW
+
     def start(self):
         """Start the program."""
         self._row = 0
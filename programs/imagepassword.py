@@ -93,10 +93,6 @@ class ImagePassword(program.TerminalProgram):
     def __init__(self, terminal):
         """Initialize the class."""
         super().__init__(terminal)
-        self._completed = False
-        self._user_info = random.choice(ImagePassword._USER_INFO)
-        self._buttons = []
-        self._lock_time = 0
         self._background = pygame.Surface(ImagePassword._BACKGROUND_SIZE)
         self._background.fill(ImagePassword._BACKGROUND_COLOUR)
         header = pygame.Surface(ImagePassword._HEADER_SIZE)
@@ -129,6 +125,18 @@ class ImagePassword(program.TerminalProgram):
         self._flash = pygame.Surface(ImagePassword._BACKGROUND_SIZE)
         self._flash.fill(ImagePassword._BACKGROUND_FLASH_COLOUR)
 
+        self.reset()
+
+    def reset(self):
+        """Reset the program, picking a new user."""
+        self._completed = False
+        self._user_info = random.choice(ImagePassword._USER_INFO)
+        self._buttons = []
+        self._lock_time = 0
+
+        # What the program looked like when it was last drawn.
+        self._drawn_key = None
+
     @property
     def help(self):
         """Return the help string for the program."""
@@ -153,9 +161,12 @@ class ImagePassword(program.TerminalProgram):
         """Pick the images to present, and generate buttons from them."""
         # Pick 3 images from the user's images, and a 4th from the remaining
         # images, shuffle together to form the final list of images.
-        user_imgs = random.sample(self._user_info, 3)
+        # random.sample() needs a sequence, so the categories are listed in
+        # the order they're declared in.
+        user_imgs = random.sample(
+            [c for c in Categories if c in self._user_info], 3)
         other_img = random.sample(
-            set(Categories).difference(self._user_info), 1)
+            [c for c in Categories if c not in self._user_info], 1)
         choices = user_imgs + other_img
         random.shuffle(choices)
 
@@ -172,26 +183,54 @@ class ImagePassword(program.TerminalProgram):
                 self._terminal.time <= self._lock_time +
                 ImagePassword._LOCK_TIME)
 
-    def draw(self):
+    def next_redraw(self):
+        """Redraw when the background flash or the lockout ends."""
+        if self._lock_time == 0:
+            return None
+
+        for end in (ImagePassword._BACKGROUND_FLASH_TIME,
+                    ImagePassword._LOCK_TIME):
+            remaining = self._lock_time + end + 1 - self._terminal.time
+            if remaining > 0:
+                return remaining
+        return None
+
+    def _flashing(self):
+        """Indicate whether the background is flashing."""
+        return (self._lock_time != 0 and
+                self._terminal.time <= self._lock_time +
+                ImagePassword._BACKGROUND_FLASH_TIME)
+
+    def _draw_key(self):
+        """Get a key that changes whenever the program's display changes."""
+        return (self._flashing(), self._locked(),
+                tuple((surf, correct) for surf, _, _, correct in self._buttons))
+
+    def dirty_rects(self):
+        """Return the program's area if anything in it has changed."""
+        if self._draw_key() == self._drawn_key:
+            return []
+        return [pygame.Rect(ImagePassword._BACKGROUND_POS,
+                            ImagePassword._BACKGROUND_SIZE)]
+
+    def draw(self, target):
         """Draw the program."""
+        self._drawn_key = self._draw_key()
+
         # Draw the background.
-        pygame.display.get_surface().blit(self._background,
-                                          ImagePassword._BACKGROUND_POS)
+        target.blit_static(self._background, ImagePassword._BACKGROUND_POS)
 
         # If the user has made a mistake, flash the background.
-        if (self._lock_time != 0 and self._terminal.time <= self._lock_time +
-                ImagePassword._BACKGROUND_FLASH_TIME):
-            pygame.display.get_surface().blit(self._flash,
-                                              ImagePassword._BACKGROUND_POS)
+        if self._flashing():
+            target.blit_static(self._flash, ImagePassword._BACKGROUND_POS)
 
         # Draw the buttons.
         if not self._locked():
             for surf, coords, _, correct in self._buttons:
-                pygame.display.get_surface().blit(surf, coords)
+                target.blit_static(surf, coords)
 
                 if correct:
-                    pygame.display.get_surface().blit(self._correct_overlay,
-                                                      coords)
+                    target.blit_static(self._correct_overlay, coords)
 
     def on_mouseclick(self, button, pos):
         """Detect whether the user clicked the correct image."""
@@ -208,7 +247,7 @@ class ImagePassword(program.TerminalProgram):
                            clicked]
                 correct = [item for _, _, item, clicked in self._buttons if
                            clicked and item in self._user_info]
-                if len(guessed) is 3:
+                if len(guessed) == 3:
                     if len(correct) == len(guessed):
                         self._completed = True
                     else:
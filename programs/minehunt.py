@@ -4,6 +4,8 @@ import pygame
 import random
 from enum import Enum, unique
 
+import display
+import memstat
 import mouse
 from . import program
 from resources import load_font
@@ -29,18 +31,14 @@ class MineHunt(program.TerminalProgram):
         """Initialize the class."""
         super().__init__(terminal)
 
-        self._puzzle = random.choice(Puzzle.puzzles)
+        self._puzzle = None
+        self._board = None
 
-        self._completed = False
-        self._exited = False
-        self._board = Board(self._puzzle.board_def,
-                            self._BOARD_MAX_WIDTH, self._BOARD_MAX_HEIGHT)
-        self._start_time = None
-        self._time_secs = None
-
-        screen_rect = pygame.display.get_surface().get_rect()
-        self._board_pos = (int((screen_rect[2] / 2) - (self._board.width / 2)),
-                           self._BOARD_Y)
+        # The boards that have been created, by their number of rows and
+        # columns. Puzzles with the same layout share a board.
+        self._boards = {}
+        self._board_pos = None
+        self._area = None
 
         self._status_font = load_font(self._FONT, self._STATUS_FONT_SIZE)
         self._timer_font = load_font(self._FONT, self._TIMER_FONT_SIZE)
@@ -56,6 +54,8 @@ class MineHunt(program.TerminalProgram):
                             True, (255, 255, 255)),
         ]
 
+        self.reset()
+
     @property
     def help(self):
         """Get the help string for the program."""
@@ -71,6 +71,48 @@ class MineHunt(program.TerminalProgram):
         return "{} user has been promoted to root".format(
             self.SUCCESS_PREFIX)
 
+    def reset(self):
+        """
+        Reset the program, picking a new puzzle.
+
+        A board is only created for the new puzzle if one hasn't already been
+        created with the same layout.
+
+        """
+        self._puzzle = random.choice(Puzzle.get_puzzles())
+
+        self._completed = False
+        self._exited = False
+        self._set_board(self._puzzle.board_def)
+        self._start_time = None
+        self._time_secs = None
+
+        # What the program looked like when it was last drawn.
+        self._drawn_key = None
+
+    def _set_board(self, board_def):
+        """Set up the board for a board definition."""
+        layout = Board.layout(board_def)
+        self._board = self._boards.get(layout)
+        if self._board is None:
+            self._board = Board(board_def,
+                                self._BOARD_MAX_WIDTH, self._BOARD_MAX_HEIGHT)
+            self._boards[layout] = self._board
+        else:
+            self._board.reset(board_def)
+
+        screen_rect = display.get_rect()
+        self._board_pos = (int((screen_rect[2] / 2) - (self._board.width / 2)),
+                           self._BOARD_Y)
+
+        # The area of the screen that the program draws on, from the top of
+        # the timer to the bottom of the end game text.
+        text_height = sum(t.get_rect().h for t in self._game_over_texts)
+        self._area = pygame.Rect(
+            0, self._TIMER_Y, screen_rect[2],
+            self._board_pos[1] + self._board.height + 5 + text_height -
+            self._TIMER_Y)
+
     def start(self):
         # Reset board
         self._board.reset()
@@ -111,9 +153,25 @@ class MineHunt(program.TerminalProgram):
             time_passed = self._terminal.time - self._start_time
             self._time_secs = int(time_passed / 1000)
 
-    def draw(self):
+    def next_redraw(self):
+        """Redraw when the timer next ticks over, if we're still playing."""
+        if self._board.state == Board.State.PLAYING:
+            return 1000 - (self._terminal.time - self._start_time) % 1000
+        return None
+
+    def _draw_key(self):
+        """Get a key that changes whenever the program's display changes."""
+        return (self._board.draw_surface, self._board.state, self._time_secs,
+                self._board.flag_count)
+
+    def dirty_rects(self):
+        """Return the program's area if anything in it has changed."""
+        return [self._area] if self._draw_key() != self._drawn_key else []
+
+    def draw(self, target):
         """Draw the program."""
-        screen = pygame.display.get_surface()
+        self._drawn_key = self._draw_key()
+        screen = target.get_surface()
         screen.blit(self._board.draw_surface,
                     self._board_pos)
         screen_rect = screen.get_rect()
@@ -127,15 +185,20 @@ class MineHunt(program.TerminalProgram):
         # Have we hit a mine? Draw game over text
         # TODO: have a game surface and draw this on
         if self._board.state != Board.State.PLAYING:
-            # Dim the board
-            dim = pygame.Surface((self._board.width, self._board.height),
-                                 flags=pygame.SRCALPHA)
+            # Dim the board, by subtracting the colour straight from the
+            # screen rather than blending a surface onto it. Blended fills
+            # ignore the clip rect if they fall entirely outside it, so clip
+            # the area by hand.
             if self._board.state == Board.State.CLEARED:
-                dim.fill((255, 100, 255, 0))
+                dim = (255, 100, 255)
             else:
-                dim.fill((100, 255, 255, 0))
-            screen.blit(dim, self._board_pos,
-                        special_flags=pygame.BLEND_RGBA_SUB)
+                dim = (100, 255, 255)
+            dim_rect = pygame.Rect(self._board_pos,
+                                   (self._board.width, self._board.height))
+            dim_rect = dim_rect.clip(screen.get_clip())
+            if dim_rect.w > 0 and dim_rect.h > 0:
+                screen.fill(dim, dim_rect,
+                            special_flags=pygame.BLEND_RGB_SUB)
 
             # Get the end game texts
             texts = (self._game_won_texts
@@ -239,7 +302,8 @@ class Board:
         self.height = self._rows * self._square_size
 
         # Create the board
-        self._surface = pygame.Surface((self.width, self.height))
+        self._surface = memstat.allocated(
+            pygame.Surface((self.width, self.height)))
         self._surface.fill((255, 255, 255))
 
         self._setup_draw()
@@ -265,7 +329,25 @@ class Board:
                 if square.type == Square.State.FLAGGED:
                     yield ((row, col), square)
 
-    def reset(self):
+    @staticmethod
+    def layout(board_def):
+        """Get the number of rows and columns of a board definition."""
+        return len(board_def), len(board_def[0])
+
+    def reset(self, board_def=None):
+        """
+        Reset the board, hiding all the squares.
+
+        If a board definition is given, the squares are changed to match it,
+        keeping their surfaces. It must have the same layout as the board.
+
+        """
+        if board_def is not None:
+            for row, line in enumerate(board_def):
+                for col, c in enumerate(line):
+                    self._board[row][col].type = self._get_type(c)
+            self._count_mines()
+
         self.state = Board.State.PLAYING
         for square in itertools.chain.from_iterable(self._board):
             square.state = Square.State.HIDDEN
@@ -324,20 +406,16 @@ class Board:
         self._square_size = int(min(max_width / self._cols,
                                     max_height / self._rows))
 
-        def get_type(c):
-            return (Square.Type.MINE if c == Puzzle.MINE_CHAR
-                    else Square.Type.EMPTY)
-
         def get_rect(r, c):
             return (c * self._square_size,
                     r * self._square_size,
                     self._square_size, self._square_size)
 
         for row, line in enumerate(board_def):
-            self._board.append([Square(get_type(c), get_rect(row, col))
+            self._board.append([Square(self._get_type(c), get_rect(row, col))
                                 for col, c in enumerate(line)])
 
-        # Now calculate neighbours and mines
+        # Now find each square's neighbours
         for row in range(self._rows):
             for col in range(self._cols):
                 neighbours = []
@@ -348,10 +426,22 @@ class Board:
                             0 <= neighbour[1] < self._cols):
                         neighbours.append(
                             self._board[neighbour[0]][neighbour[1]])
-                square = self._board[row][col]
-                square.set_neighbours(neighbours)
-                if square.type == Square.Type.MINE:
-                    self.mine_count += 1
+                self._board[row][col].neighbours = neighbours
+
+        self._count_mines()
+
+    @staticmethod
+    def _get_type(c):
+        return (Square.Type.MINE if c == Puzzle.MINE_CHAR
+                else Square.Type.EMPTY)
+
+    def _count_mines(self):
+        """Count the mines, both in total and next to each square."""
+        self.mine_count = 0
+        for square in itertools.chain.from_iterable(self._board):
+            square.count_mines()
+            if square.type == Square.Type.MINE:
+                self.mine_count += 1
 
     def _hit_square(self, pos):
         for square in itertools.chain.from_iterable(self._board):
@@ -361,7 +451,7 @@ class Board:
         return None
 
     def _setup_draw(self):
-        self.draw_surface = self._surface.copy()
+        self.draw_surface = memstat.allocated(self._surface.copy())
 
         for square in itertools.chain.from_iterable(self._board):
             self.draw_surface.blit(square.get_surface(),
@@ -415,20 +505,15 @@ class Square:
 
         self._surfaces[Square.State.HIDDEN].fill((180, 180, 180))
         self._surfaces[Square.State.FLAGGED].fill((180, 180, 180))
-        self._surfaces[Square.State.REVEALED].fill((255, 255, 255))
 
-        for surface in self._surfaces.values():
-            pygame.draw.rect(surface, (0, 0, 0),
+        for state in (Square.State.HIDDEN, Square.State.FLAGGED):
+            pygame.draw.rect(self._surfaces[state], (0, 0, 0),
                              (0, 0, self.rect[2], self.rect[3]), 1)
 
-        # If we are a mine, then add mine to revealed square
-        if self.type == Square.Type.MINE:
-            center = (int(self.rect[2] / 2), int(self.rect[3] / 2))
-            pygame.draw.circle(self._surfaces[Square.State.REVEALED],
-                               (0, 0, 0),
-                               center,
-                               int(self._MINE_SCALE_FACTOR * center[0]),
-                               0)
+        # The revealed square depends on the neighbours, so it isn't drawn
+        # until they're known. This is the type and count of mines nearby it
+        # was last drawn with.
+        self._revealed_key = None
 
         # Add a flag to the flagged square
         flag = self._surfaces[Square.State.FLAGGED]
@@ -452,19 +537,43 @@ class Square:
     def collidepoint(self, board_pos):
         return pygame.Rect(self.rect).collidepoint(board_pos)
 
-    def set_neighbours(self, neighbours):
-        self.neighbours = neighbours
+    def count_mines(self):
+        """
+        Count the neighbours that are mines, once they've been set.
 
+        The revealed square is redrawn if the square's type or the count has
+        changed since it was last drawn.
+
+        """
         # Count mines!
-        self.mines_nearby = len([n for n in neighbours
+        self.mines_nearby = len([n for n in self.neighbours
                                  if n.type == Square.Type.MINE])
 
+        if self._revealed_key != (self.type, self.mines_nearby):
+            self._revealed_key = (self.type, self.mines_nearby)
+            self._draw_revealed()
+
+    def _draw_revealed(self):
+        """Draw the revealed square."""
+        surface = self._surfaces[Square.State.REVEALED]
+        surface.fill((255, 255, 255))
+        pygame.draw.rect(surface, (0, 0, 0),
+                         (0, 0, self.rect[2], self.rect[3]), 1)
+
+        # If we are a mine, then add mine to revealed square
+        if self.type == Square.Type.MINE:
+            center = (int(self.rect[2] / 2), int(self.rect[3] / 2))
+            pygame.draw.circle(surface,
+                               (0, 0, 0),
+                               center,
+                               int(self._MINE_SCALE_FACTOR * center[0]),
+                               0)
+
         # Draw the number on our revealed surface
         if self.mines_nearby > 0:
             font = load_font(self._FONT, int(self.rect[2] * self._FONT_SCALE))
             text = font.render(str(self.mines_nearby), True, (0, 0, 0))
 
-            surface = self._surfaces[Square.State.REVEALED]
             surface_rect = surface.get_rect()
             text_rect = text.get_rect()
             surface.blit(text,
@@ -473,7 +582,16 @@ class Square:
 
 
 class Puzzle:
-    puzzles = []
+
+    """
+    A minehunt puzzle.
+
+    The puzzles are defined as text in _PUZZLE_DEFS below, and are parsed and
+    checked the first time they're needed.
+
+    """
+
+    _puzzles = None
 
     MINE_CHAR = "o"
     EMPTY_CHAR = "."
@@ -511,8 +629,12 @@ class Puzzle:
             "Incorrect mine count: expected {}, actual {}".format(
                 mine_count, defined_count)
 
-        # Add to global puzzle list
-        Puzzle.puzzles.append(self)
+    @staticmethod
+    def get_puzzles():
+        """Get the list of puzzles, parsing them if necessary."""
+        if Puzzle._puzzles is None:
+            Puzzle._puzzles = [Puzzle(*d) for d in _PUZZLE_DEFS]
+        return Puzzle._puzzles
 
     def _find_click_mine(self):
         for row in range(len(self.board_def)):
@@ -524,10 +646,12 @@ class Puzzle:
         return None
 
 
+"""Puzzle definitions, as (board, time condition, mine count)."""
+_PUZZLE_DEFS = (
 #
 # 8 rows x 10 cols boards
 #
-Puzzle(
+(
 """
 . . . . . o . . . .
 o . . . . . . . . .
@@ -539,9 +663,9 @@ o x . . . . . o . .
 . . . . . . . . o .
 """,
 Puzzle.Time.ODD,
-mine_count=8)
+8),
 
-Puzzle("""
+("""
 . . . . . o . . . .
 o o . . . . . . . .
 . . . . . . . . . .
@@ -552,10 +676,10 @@ o o . . . . . . x .
 . . . . . . . . . o
 """,
 Puzzle.Time.EVEN,
-mine_count=9)
+9),
 
 
-Puzzle("""
+("""
 . o . . . o . . . .
 o o . . . . . . . .
 . . . . . . . . . .
@@ -566,12 +690,12 @@ o x . . . . . . o .
 . o . . o . . . . .
 """,
 Puzzle.Time.ANY,
-mine_count=10)
+10),
 
 #
 # 8 rows x 9 cols boards
 #
-Puzzle(
+(
 """
 o . . . . o . . .
 . . . . . . . . .
@@ -583,9 +707,9 @@ o o . . . . . o .
 . . . . . . . . o
 """,
 Puzzle.Time.EVEN,
-mine_count=7)
+7),
 
-Puzzle(
+(
 """
 o . . . . o . . .
 o . . . . . . . .
@@ -597,9 +721,9 @@ o o . . . . . o .
 . o . . . . . . o
 """,
 Puzzle.Time.ODD,
-mine_count=11)
+11),
 
-Puzzle(
+(
 """
 o . . . . o . . .
 . . . . . . . . .
@@ -611,5 +735,5 @@ o o . . . . . . .
 . . . . . . . . o
 """,
 Puzzle.Time.ANY,
-mine_count=9)
-
+9),
+)
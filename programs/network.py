@@ -108,7 +108,10 @@ class NetworkManager(program.TerminalProgram):
     def __init__(self, terminal):
         """Initialize the class."""
         super().__init__(terminal)
+        self.reset()
 
+    def reset(self):
+        """Reset the program, selecting a new puzzle."""
         self._completed = False
         self._exited = False
 
@@ -175,28 +178,6 @@ class NetworkManager(program.TerminalProgram):
                  "Network map:",
                  ""]
 
-        # If error mode, start reversing the path
-        if self._error_mode:
-            if self._last_revert_time is None:
-                last_time, delay = self._error_mode_start, \
-                                   self._ERROR_INITIAL_WAIT
-            else:
-                last_time, delay = self._last_revert_time, \
-                                   self._REVERT_LINK_TIME
-            if last_time + delay < self._terminal.time:
-                # Find where we came from
-                from_node = self._visited_from[self._curr]
-
-                # Remove link
-                del self._visited_from[self._curr]
-
-                # Update position. If we have reached None, then start again
-                if from_node is None:
-                    self.start()
-                else:
-                    self._curr = from_node
-                    self._last_revert_time = self._terminal.time
-
         is_on = (self._error_mode or
                  self._terminal.time % (self._ON_MS + self._OFF_MS) <
                  self._ON_MS)
@@ -253,6 +234,43 @@ class NetworkManager(program.TerminalProgram):
 
         return reversed(lines)
 
+    def run(self):
+        """If in error mode, reverse the path one link at a time."""
+        # Reverts are scheduled from when the previous one was due, rather
+        # than when it happened, so that the animation runs at a steady rate.
+        while (self._error_mode and
+               self._next_revert_time() < self._terminal.time):
+            revert_time = self._next_revert_time()
+
+            # Find where we came from
+            from_node = self._visited_from[self._curr]
+
+            # Remove link
+            del self._visited_from[self._curr]
+
+            # Update position. If we have reached None, then start again
+            if from_node is None:
+                self.start()
+            else:
+                self._curr = from_node
+                self._last_revert_time = revert_time
+
+    def _next_revert_time(self):
+        """Get the time that the next link should be reverted."""
+        if self._last_revert_time is None:
+            return self._error_mode_start + self._ERROR_INITIAL_WAIT
+        return self._last_revert_time + self._REVERT_LINK_TIME
+
+    def next_redraw(self):
+        """Redraw for the next link revert or the next blink of the cursor."""
+        if self._error_mode:
+            return max(1, self._next_revert_time() + 1 - self._terminal.time)
+
+        phase = self._terminal.time % (self._ON_MS + self._OFF_MS)
+        if phase < self._ON_MS:
+            return self._ON_MS - phase
+        return self._ON_MS + self._OFF_MS - phase
+
     def start(self):
         # Reset board
         self._visited_from = {}
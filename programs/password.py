@@ -26,15 +26,8 @@ class PasswordGuess(program.TerminalProgram):
 
     def __init__(self, terminal):
         """Initialize the class."""
-        self._guesses = 0
-        self._guessed = False
-        self._aborted = False
-
-        # Pick a user
-        self._user = random.choice(list(PasswordGuess._PASSWORDS.keys()))
-        self._password = random.choice(PasswordGuess._PASSWORDS[self._user])
-
         super().__init__(terminal)
+        self.reset()
 
     @property
     def help(self):
@@ -52,6 +45,16 @@ class PasswordGuess(program.TerminalProgram):
             self._user,
             PasswordGuess._MAX_GUESSES - self._guesses)
 
+    def reset(self):
+        """Reset the program."""
+        self._guesses = 0
+        self._guessed = False
+        self._aborted = False
+
+        # Pick a user
+        self._user = random.choice(list(PasswordGuess._PASSWORDS.keys()))
+        self._password = random.choice(PasswordGuess._PASSWORDS[self._user])
+
     def start(self):
         """Start the program."""
         # Don't reset guesses if we are restarting after an abort
@@ -80,18 +80,47 @@ class TerminalProgram:
         """Terminal buffer contents for this interactive program."""
         return []
 
-    def draw(self):
-        """Draw the program, if it is graphical."""
+    def draw(self, target):
+        """Draw the program onto a render target, if it is graphical."""
         pass
 
+    def dirty_rects(self):
+        """
+        Return the rects that have changed since the program was last drawn.
+
+        Returns None if the whole screen needs to be redrawn.
+
+        """
+        return None
+
     def run(self):
         """Run any background program logic that isn't user input driven."""
         pass
 
+    def next_redraw(self):
+        """
+        Return the time in ms until the program's display next changes.
+
+        Returns None if the display only changes in response to input.
+
+        """
+        return None
+
     def start(self):
         """Called when the program is started, or restarted."""
         pass
 
+    def reset(self):
+        """
+        Reset the program for a new attempt at the level.
+
+        This picks a new puzzle and clears any progress, as if the program had
+        just been created, but should keep any surfaces that have already been
+        built wherever they can be reused.
+
+        """
+        pass
+
     def text_input(self, line):
         """
         Handle a line of input from the terminal (Used for TERMINAL).
@@ -4,6 +4,8 @@ import os
 import sys
 import pygame
 
+import display
+
 # A dict mapping filenames to the in-memory representation for each asset.
 _media = {}
 
@@ -28,6 +30,6 @@ def load_font(filename, size):
 def load_image(filename):
     """Load an image from disk, return a pygame Surface."""
     if filename not in _media:
-        _media[filename] = pygame.image.load(
-            make_path(filename)).convert_alpha()
+        _media[filename] = display.current.convert_alpha(
+            pygame.image.load(make_path(filename)))
     return _media[filename]
@@ -0,0 +1,49 @@
+"""
+Startup tracing.
+
+Records how long each stage of startup takes, and how long it is from
+launch until the first frame is presented. This module should be imported
+before anything else, as it starts the clock.
+
+"""
+
+import contextlib
+import time
+
+_start = time.perf_counter()
+
+# (stage name, duration, time since launch at end of stage) tuples, in the
+# order the stages finished.
+_stages = []
+
+_first_present = None
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Context manager recording the time taken by a stage of startup."""
+    begin = time.perf_counter()
+    try:
+        yield
+    finally:
+        end = time.perf_counter()
+        _stages.append((name, end - begin, end - _start))
+
+
+def presented():
+    """Note that a frame has been presented."""
+    global _first_present
+    if _first_present is None:
+        _first_present = time.perf_counter() - _start
+
+
+def report():
+    """Get a summary of the startup stages."""
+    lines = ['Startup trace:']
+    for name, duration, elapsed in _stages:
+        lines.append('  {:<24} {:8.1f}ms  (at {:.1f}ms)'.format(
+            name, duration * 1000, elapsed * 1000))
+    if _first_present is not None:
+        lines.append('  {:<24} {:8}    (at {:.1f}ms)'.format(
+            'first frame presented', '', _first_present * 1000))
+    return '\n'.join(lines)
@@ -9,8 +9,15 @@ from collections import deque
 
 import pygame
 
+import background
 import constants
+import display
+import hud
+import memstat
+import profiler
 import timer
+import tracing
+import watchdog
 import mouse
 from resources import load_font
 from programs.program import BadInput
@@ -72,6 +79,18 @@ class Terminal:
         self._font = load_font(Terminal._TEXT_FONT, Terminal._TEXT_SIZE)
         self._has_focus = True
 
+        # Redraw tracking: whether something has changed since the last draw,
+        # and the terminal time at which the display next changes by itself.
+        self._dirty = True
+        self._redraw_at = 0
+
+        # Dirty rect tracking: the layout of the contents as last drawn, the
+        # graphical program (if any) last drawn, and the layout for the next
+        # draw if it has already been worked out.
+        self._drawn_layout = None
+        self._drawn_mode = None
+        self._layout = None
+
         # Timer attributes
         self._timer = timer.Timer()
         self._countdown_timer = CountdownTimer(time,
@@ -147,6 +166,68 @@ class Terminal:
             except ValueError:
                 self.output(["Invalid time"])
 
+        # Frame-time overlay
+        elif cmd == "hud":
+            hud.current.visible = not hud.current.visible
+
+        # Profile the next frames
+        elif cmd.startswith("profile "):
+            try:
+                frames = int(cmd.split(" ")[1])
+            except ValueError:
+                self.output(["Invalid frame count"])
+            else:
+                if frames <= 0:
+                    self.output(["Invalid frame count"])
+                elif profiler.current.request(frames, self.output):
+                    self.output(["Profiling the next {} frames".format(
+                        frames)])
+                else:
+                    self.output(["Already profiling"])
+
+        # Save the stacks sampled during slow frames
+        elif cmd == "stalls":
+            if watchdog.current is None:
+                self.output(["The stall watchdog isn't running"])
+            else:
+                self.output([watchdog.current.report()])
+                background.submit(
+                    watchdog.StallWatchdog.write,
+                    watchdog.current.collapsed(), watchdog.default_filename(),
+                    callback=lambda path: self.output(
+                        ["Stacks saved to {}".format(path)]))
+
+        # Surface allocations and memory use
+        elif cmd == "memstat":
+            if not memstat.enabled():
+                memstat.enable()
+                self.output(["Counting surface allocations, type 'memstat' "
+                             "again for a report"])
+            else:
+                self.output(memstat.report())
+
+        # Python allocations, traced with tracemalloc
+        elif cmd == "memstat py":
+            if not memstat.python_tracing():
+                memstat.start_python_tracing()
+                self.output(["Tracing Python allocations, type 'memstat py' "
+                             "again for a report"])
+            else:
+                background.submit(memstat.python_report,
+                                  callback=self.output)
+
+        # Start tracing, or save what has been traced so far
+        elif cmd == "trace":
+            if not tracing.enabled():
+                tracing.enable()
+                self.output(["Tracing started, type 'trace' again to save"])
+            else:
+                background.submit(
+                    tracing.dump, tracing.snapshot(),
+                    tracing.default_filename(),
+                    callback=lambda path: self.output(
+                        ["Trace saved to {}".format(path)]))
+
         elif cmd:
             self.output(["Unknown command '{}'.".format(cmd)])
 
@@ -173,6 +254,7 @@ class Terminal:
             # The buffer is ordered left to right from newest to oldest.
             # This will push old lines off the end of the buffer if it is full.
             self._buf.appendleft(line)
+        self._dirty = True
 
     def _complete_input(self):
         """Process a line of input from the user."""
@@ -202,6 +284,7 @@ class Terminal:
         # Current line doesn't have prompt, so we don't have to worry about
         # adding it.
         self._current_line = ""
+        self._dirty = True
 
     def _tab_complete(self):
         # Only works outside programs for now
@@ -240,6 +323,11 @@ class Terminal:
         """Return the current time."""
         return self._timer.time
 
+    @property
+    def current_program(self):
+        """Return the program that is running, or None."""
+        return self._current_program
+
     def get_current_line(self, include_prompt=False):
         """Get the current input line."""
         if include_prompt:
@@ -259,6 +347,7 @@ class Terminal:
         """Set the current input line."""
         # Don't need to add prompt - this gets added by get_current_line()
         self._current_line = line
+        self._dirty = True
 
     def on_keypress(self, key, key_unicode):
         """Handle a user keypress."""
@@ -266,6 +355,8 @@ class Terminal:
         if self._freeze_time is not None or self._rebooting:
             return
 
+        self._dirty = True
+
         # Any typing other than arrows reset history navigation
         if key not in (pygame.K_UP, pygame.K_DOWN):
             self._cmd_history.reset_navigation()
@@ -292,7 +383,8 @@ class Terminal:
         if (self._current_program is not None and
                 (self._current_program.PROPERTIES.is_graphical or
                  self._current_program.PROPERTIES.intercept_keypress)):
-            self._current_program.on_keypress(key, key_unicode)
+            with tracing.span('on_keypress', self._current_program):
+                self._current_program.on_keypress(key, key_unicode)
             return
 
         # Now handle terminal keyboard input
@@ -327,6 +419,7 @@ class Terminal:
         """Handle a user mouse click."""
         if self._current_program:
             self._current_program.on_mouseclick(button, pos)
+            self._dirty = True
 
     def on_mousemove(self, pos):
         """Handle a user mouse move."""
@@ -337,6 +430,7 @@ class Terminal:
         """Handle a window active event."""
         if active_event.input_focus_change:
             self._has_focus = active_event.gained
+            self._dirty = True
 
     def output(self, output):
         """Add a list of lines to the displayed output."""
@@ -347,15 +441,18 @@ class Terminal:
         """Freeze terminal for 'time' ms, displaying progress bar."""
         self._freeze_start = self._timer.time
         self._freeze_time = time
+        self._dirty = True
 
     def reduce_time(self, time):
         """Reduce the available time by 'time' seconds."""
         self._countdown_timer.update(time * 1000)
+        self._dirty = True
 
     def reboot(self, msg=""):
         """Simulate a reboot."""
         # Clear the buffer.
         self._buf.clear()
+        self._dirty = True
 
         self._rebooting = True
         self._reboot_update_time = self._timer.time
@@ -393,26 +490,133 @@ class Terminal:
                        len(self._reboot_buf) - len(end_msgs) - 1)
         self._reboot_buf.extend([(PAUSE_LEN, "")] * blank_lines + end_msgs)
 
-    def draw(self):
-        """Draw terminal."""
+    def reset(self):
+        """
+        Reset the terminal for another attempt at the level.
+
+        This leaves the terminal as it was when it was created, except that
+        the programs are reset rather than created again, and the bezel is
+        kept.
+
+        """
+        self.locked = False
+        self._current_line = ""
+        self._buf.clear()
+        self._cmd_history = CommandHistory(self, maxlen=Terminal._HISTORY_SIZE)
+
+        self._dirty = True
+        self._redraw_at = 0
+        self._drawn_layout = None
+        self._drawn_mode = None
+        self._layout = None
+
+        self._timer.reset()
+        self._countdown_timer.reset()
+
+        self._freeze_start = None
+        self._freeze_time = None
+
+        self._rebooting = False
+        self._reboot_buf.clear()
+
+        self._held_key = None
+        self._key_last_repeat = None
+
+        for program in self._programs.values():
+            program.reset()
+        self._current_program = None
+
+        self.reboot()
+
+    def draw(self, target):
+        """Draw terminal onto a render target."""
         # If the current program is a graphical one, draw it now, else draw
         # monitor contents.
         if (self._current_program and
                 self._current_program.PROPERTIES.is_graphical):
-            self._current_program.draw()
+            with tracing.span('draw', self._current_program):
+                self._current_program.draw(target)
             if not self._current_program.PROPERTIES.skip_bezel:
-                self.draw_bezel()
+                self.draw_bezel(target)
         else:
-            self._draw_contents()
-            self.draw_bezel()
+            if self._layout is None:
+                self._layout = self._layout_contents()
+            with tracing.span('_draw_contents', self):
+                self._draw_contents(target, self._layout)
+            self.draw_bezel(target)
+
+        # Remember what was drawn, so that we can tell what has changed next
+        # time.
+        self._drawn_layout = self._layout or ([], None)
+        self._drawn_mode = (self._current_program if
+                            self._current_program and
+                            self._current_program.PROPERTIES.is_graphical
+                            else None)
+        self._layout = None
 
         # Make sure cursor is an arrow if we are not in a program. This should
         # be a no-op if it is already an arrow.
         if self._current_program is None:
             mouse.current.set_cursor(mouse.Cursor.ARROW)
 
-    def _draw_contents(self):
-        """Draw the terminal."""
+        self._dirty = False
+        self._redraw_at = self._timer.time + self._next_change()
+
+    def dirty(self):
+        """Indicate whether the terminal needs to be redrawn."""
+        return self._dirty or self._timer.time >= self._redraw_at
+
+    def next_redraw(self):
+        """Return the time in ms until the terminal next needs redrawing."""
+        return 0 if self.dirty() else self._redraw_at - self._timer.time
+
+    def _next_change(self):
+        """Work out how long until the display changes by itself."""
+        changes = [self._countdown_timer.next_change()]
+
+        # Cursor blinking
+        if self._cursor_shown():
+            phase = self._timer.time % (Terminal._CURSOR_ON_MS +
+                                        Terminal._CURSOR_OFF_MS)
+            if phase < Terminal._CURSOR_ON_MS:
+                changes.append(Terminal._CURSOR_ON_MS - phase)
+            else:
+                changes.append(Terminal._CURSOR_ON_MS +
+                               Terminal._CURSOR_OFF_MS - phase)
+
+        # The next line of reboot text
+        if self._rebooting:
+            changes.append(self._reboot_update_time - self._timer.time)
+
+        # The next step of the freeze progress bar
+        if self._freeze_time is not None:
+            changes.append(self._freeze_time // self._PROGRESS_BAR_SIZE)
+
+        # The next repeat of a held key
+        if self._held_key is not None:
+            changes.append(self._next_key_repeat() - self._timer.time)
+
+        if self._current_program is not None:
+            changes.append(self._current_program.next_redraw())
+
+        return max(1, min(c for c in changes if c is not None))
+
+    def _cursor_shown(self):
+        """Indicate whether the (blinking) cursor is displayed at all."""
+        return ((self._current_program is None or
+                 not self._current_program.PROPERTIES.hide_cursor) and
+                not self._rebooting)
+
+    def _layout_contents(self):
+        """
+        Work out what the terminal contents look like.
+
+        Returns a tuple of (lines, cursor), where lines is a list of tuples of
+        (text, colour, font, y coordinate, height) for each visible line, and
+        cursor is a tuple of (rect, colour, filled) or None if the cursor is
+        currently off.
+
+        """
         if self._rebooting:
             # If we're rebooting, don't draw the prompt
             current_line = ""
@@ -436,7 +640,8 @@ class Terminal:
         else:
             buf = self._buf
 
-        # Draw the buffer.
+        # Lay out the buffer.
+        lines = []
         y_coord = Terminal._TEXT_START[1]
         first_line_height = None
         for line in list(itertools.chain(
@@ -479,33 +684,92 @@ class Terminal:
                 first_line_height = line_height
 
             y_coord -= line_height
-
-            text = font.render(line, True, colour)
-            pygame.display.get_surface().blit(
-                text, (Terminal._TEXT_START[0], y_coord))
+            lines.append((line, colour, font, y_coord, line_height))
 
         # Determine whether the cursor is on.
-        if ((self._current_program is None or
-                not self._current_program.PROPERTIES.hide_cursor) and
-                not self._rebooting and
+        cursor = None
+        if (self._cursor_shown() and
                 (self._timer.time % (Terminal._CURSOR_ON_MS +
                                      Terminal._CURSOR_OFF_MS) <
                  Terminal._CURSOR_ON_MS)):
             first_line_size = self._font.size(current_line)
-            pygame.draw.rect(pygame.display.get_surface(),
-                             Terminal._TEXT_COLOUR,
-                             (Terminal._TEXT_START[0] + first_line_size[0] + 1,
-                              Terminal._TEXT_START[1] - first_line_height - 1,
-                              Terminal._CURSOR_WIDTH, first_line_size[1]),
-                             0 if self._has_focus else 1)
-
-    def draw_bezel(self, power_off=False):
+            cursor = (pygame.Rect(
+                Terminal._TEXT_START[0] + first_line_size[0] + 1,
+                Terminal._TEXT_START[1] - first_line_height - 1,
+                Terminal._CURSOR_WIDTH, first_line_size[1]),
+                Terminal._TEXT_COLOUR, self._has_focus)
+
+        return lines, cursor
+
+    def _draw_contents(self, target, layout):
+        """Draw the terminal."""
+        screen = target.get_surface()
+        clip = screen.get_clip()
+        lines, cursor = layout
+
+        # Draw the buffer, skipping any lines that are clipped out entirely
+        # so that we don't waste time rendering text nobody will see.
+        for line, colour, font, y_coord, line_height in lines:
+            if clip.colliderect(self._line_rect(y_coord, line_height)):
+                text = font.render(line, display.antialias(), colour)
+                screen.blit(text, (Terminal._TEXT_START[0], y_coord))
+
+        if cursor is not None:
+            rect, colour, filled = cursor
+            pygame.draw.rect(screen, colour, rect, 0 if filled else 1)
+
+    @staticmethod
+    def _line_rect(y_coord, line_height):
+        """Get the rect covered by a line of the terminal."""
+        return pygame.Rect(0, y_coord,
+                           display.get_rect().w,
+                           line_height)
+
+    def dirty_rects(self):
+        """
+        Return the rects that have changed since the terminal was last drawn.
+
+        Returns None if the whole screen needs to be redrawn.
+
+        """
+        program = self._current_program
+        graphical = program is not None and program.PROPERTIES.is_graphical
+        mode = program if graphical else None
+        if self._drawn_layout is None or mode != self._drawn_mode:
+            return None
+
+        if graphical:
+            rects = program.dirty_rects()
+            if rects is None:
+                return None
+        else:
+            # Lay out the contents now, and keep hold of the layout so that
+            # we don't need to do it all over again when drawing.
+            self._layout = self._layout_contents()
+            old_lines, old_cursor = self._drawn_layout
+            new_lines, new_cursor = self._layout
+
+            rects = []
+            for old, new in itertools.zip_longest(old_lines, new_lines):
+                if old != new:
+                    rects.extend(self._line_rect(*line[3:]) for line in
+                                 (old, new) if line is not None)
+
+            if old_cursor != new_cursor:
+                rects.extend(cursor[0] for cursor in (old_cursor, new_cursor)
+                             if cursor is not None)
+
+        rects.extend(self._countdown_timer.dirty_rects(Terminal._TIMER_POS))
+        return rects
+
+    def draw_bezel(self, target, power_off=False):
         """Draw the bezel."""
-        bezel = self._bezel if not power_off else self._bezel_off
-        pygame.display.get_surface().blit(bezel, bezel.get_rect())
+        with tracing.span('draw_bezel', self):
+            bezel = self._bezel if not power_off else self._bezel_off
+            target.blit_static(bezel, bezel.get_rect())
 
-        # Draw the countdown text.
-        self._countdown_timer.draw(Terminal._TIMER_POS)
+            # Draw the countdown text.
+            self._countdown_timer.draw(target, Terminal._TIMER_POS)
 
     def run(self):
         """Run terminal logic."""
@@ -526,6 +790,7 @@ class Terminal:
                 self.output([self._current_program.success_syslog])
 
             self._current_program = None
+            self._dirty = True
 
             # Display the prompt again.
             self._reset_prompt()
@@ -544,21 +809,28 @@ class Terminal:
             # Reset current line to prompt
             self._reset_prompt()
 
-        # See whether a key is held, and repeat it
-        if self._held_key is not None:
-            key, key_unicode, start = self._held_key
-            if self._key_last_repeat is None:
-                last, delay = start, Terminal._KEY_REPEAT_INITIAL_DELAY
-            else:
-                last, delay = self._key_last_repeat, Terminal._KEY_REPEAT_DELAY
-
-            if (self._timer.time - last) > delay:
-                self._key_last_repeat = self._timer.time
-                self.on_keypress(key, key_unicode)
+        # See whether a key is held, and repeat it. Repeats are scheduled from
+        # when the last one was due rather than when it happened, and any that
+        # were missed are caught up, so that the repeat rate stays steady.
+        while (self._held_key is not None and
+                self._timer.time >= self._next_key_repeat()):
+            key, key_unicode, _ = self._held_key
+            self._key_last_repeat = self._next_key_repeat()
+            self.on_keypress(key, key_unicode)
 
         # Run the current program logic
         if self._current_program is not None:
-            self._current_program.run()
+            with tracing.span('run', self._current_program):
+                self._current_program.run()
+
+    def _next_key_repeat(self):
+        """Return the time at which the held key should next repeat."""
+        _, _, start = self._held_key
+        if self._key_last_repeat is None:
+            last, delay = start, Terminal._KEY_REPEAT_INITIAL_DELAY
+        else:
+            last, delay = self._key_last_repeat, Terminal._KEY_REPEAT_DELAY
+        return last + delay
 
     def completed(self):
         """Indicate whether the player has been successful."""
@@ -573,6 +845,9 @@ class Terminal:
     @paused.setter
     def paused(self, value):
         """Unpause the game."""
+        # Bring the timer up to date first, so that the time spent paused
+        # isn't counted once the game is unpaused.
+        self._timer.update()
         self._timer.paused = value
 
 
@@ -630,18 +905,26 @@ class CountdownTimer:
 
     """Class for the terminal countdown timer."""
     def __init__(self, time_in_s, warning_secs):
-        self._timeleft = time_in_s * 1000
+        self._time_in_s = time_in_s
         self._timer_font = load_font(CountdownTimer._TIMER_FONT,
                                      CountdownTimer._TIMER_SIZE)
         self._timer_large_font = load_font(CountdownTimer._TIMER_FONT,
                                            CountdownTimer._TIMER_LARGE_SIZE)
         self._warning_secs = warning_secs
+        self.reset()
+
+    def reset(self):
+        """Reset the timer to its starting time."""
+        self._timeleft = self._time_in_s * 1000
 
         # Are we currently flashing the timer, and if so what time did it start
         self._flash_start = None
 
         # The times at which the timer should be large and flashing!
-        self._flash_times = [warning_secs, 15, 5, 4, 3, 2, 1]
+        self._flash_times = [self._warning_secs, 15, 5, 4, 3, 2, 1]
+
+        # What was displayed the last time the timer was drawn, and where.
+        self._drawn = None
 
     @property
     def secs_left(self):
@@ -651,6 +934,20 @@ class CountdownTimer:
     def ended(self):
         return self._timeleft <= 0
 
+    def next_change(self):
+        """Return the ms of countdown until the displayed timer changes."""
+        if self.ended:
+            return None
+
+        changes = [self._timeleft % 1000 + 1]
+        if self._flash_start is not None:
+            phase = self._timeleft % (self._FLASH_ON + self._FLASH_OFF)
+            if phase >= self._FLASH_OFF:
+                changes.append(phase - self._FLASH_OFF + 1)
+            else:
+                changes.append(phase + 1)
+        return min(changes)
+
     def update(self, ms_to_subtract):
         self._timeleft -= ms_to_subtract
         if self._timeleft <= 0:
@@ -673,28 +970,72 @@ class CountdownTimer:
                         self.secs_left <= self._flash_times[0]):
                     self._flash_times = self._flash_times[1:]
 
-    def draw(self, pos):
+    def _display(self):
+        """
+        Work out what the timer looks like right now.
+
+        Returns a tuple of (text, colour, font), or None if the timer is
+        flashed off.
+
+        """
         # If we are flashing the text, then skip draw if we are in an 'off'
         if (self._flash_start is not None and
                 self._timeleft % (self._FLASH_ON + self._FLASH_OFF)
                 < self._FLASH_OFF):
-            return
+            return None
 
         # Are we using normal font or the large flashing font?
         font = self._timer_font
         if self._flash_start is not None:
             font = self._timer_large_font
 
-        # Draw the countdown text on a semi transparent background
         colour = CountdownTimer._TIMER_COLOUR
         if self.secs_left <= self._warning_secs:
             colour = CountdownTimer._TIMER_WARNING_COLOUR
         minutes, seconds = divmod(self.secs_left, 60)
-        text = font.render('{}:{:02}'.format(minutes, seconds), True, colour)
-        surf = pygame.Surface((text.get_rect().w + 4, text.get_rect().h))
-        surf.set_alpha(100)
-        pygame.display.get_surface().blit(surf, pos)
-        pygame.display.get_surface().blit(text, (pos[0] + 2, pos[1]))
+        return '{}:{:02}'.format(minutes, seconds), colour, font
+
+    @staticmethod
+    def _rect(pos, shown):
+        """Get the rect covered by the timer, including its background."""
+        if shown is None:
+            return None
+        text, _, font = shown
+        w, h = font.size(text)
+        return pygame.Rect(pos, (w + 4, h))
+
+    def dirty_rects(self, pos):
+        """Return the rects that have changed since the timer was drawn."""
+        shown = self._display()
+        if self._drawn is not None and self._drawn[0] == shown:
+            return []
+
+        rects = [self._rect(pos, shown)]
+        if self._drawn is not None:
+            rects.append(self._drawn[1])
+        return [r for r in rects if r is not None]
+
+    def draw(self, target, pos):
+        shown = self._display()
+        self._drawn = (shown, self._rect(pos, shown))
+        if shown is None:
+            return
+
+        # Draw the countdown text on a semi transparent background, or an
+        # opaque one in the low-spec profile, which saves blending it.
+        text, colour, font = shown
+        text = memstat.allocated(font.render(text, display.antialias(),
+                                             colour))
+        rect = pygame.Rect(pos, (text.get_rect().w + 4, text.get_rect().h))
+        screen = target.get_surface()
+        if display.antialias():
+            surf = memstat.allocated(pygame.Surface(rect.size,
+                                                    pygame.SRCALPHA))
+            surf.fill((0, 0, 0, 100))
+            screen.blit(surf, rect)
+        else:
+            screen.fill((0, 0, 0), rect)
+        screen.blit(text, (pos[0] + 2, pos[1]))
 
     def _get_font(self):
         if self._flash_start is not None:
@@ -1,6 +1,30 @@
 """Timer module."""
 
-import pygame
+import asyncio
+import time
+
+
+class SimulationClock:
+
+    """
+    The clock that game logic runs against.
+
+    Timers read the time from here rather than from pygame directly, so that
+    the game loop decides how game time moves forward.
+
+    """
+
+    def __init__(self):
+        """Initialize the class."""
+        self.ticks = 0
+
+    def advance(self, ms):
+        """Move the clock forward by a number of ms."""
+        self.ticks += ms
+
+
+"""The simulation clock used by all timers."""
+clock = SimulationClock()
 
 
 class Timer:
@@ -13,17 +37,104 @@ class Timer:
 
     def reset(self):
         """Reset the timer."""
-        self._lasttime = pygame.time.get_ticks()
+        self._lasttime = clock.ticks
         self.paused = False
         self.time = 0
         self.frametime = 0
 
     def update(self):
         """Update the time values based on the current tickcount."""
-        time = pygame.time.get_ticks()
+        time = clock.ticks
 
         if not self.paused:
             self.frametime = time - self._lasttime
             self.time += self.frametime
 
         self._lasttime = time
+
+
+class FrameLimiter:
+
+    """
+    Cap the frame rate by sleeping for whatever is left of the frame budget.
+
+    time.sleep() tends to overshoot by a little, so the limiter sleeps for the
+    bulk of the remaining time and spins for the last fraction, adapting the
+    length of the spin to how late the OS has been waking us up.
+
+    """
+
+    _INITIAL_SLACK = 0.001
+    _MAX_SLACK = 0.004
+    _SLACK_DECAY = 0.95
+
+    def __init__(self, fps):
+        """Initialize the class."""
+        self._slack = FrameLimiter._INITIAL_SLACK
+        self._frame_start = time.perf_counter()
+        self.fps = fps
+
+    @property
+    def fps(self):
+        """The target frame rate, or 0 if the frame rate is uncapped."""
+        return self._fps
+
+    @fps.setter
+    def fps(self, value):
+        """Set the target frame rate."""
+        self._fps = value
+        self._budget = 1 / value if value else 0
+
+    def remaining(self):
+        """Return the time in seconds left in the current frame's budget."""
+        if not self._budget:
+            return 0
+        return self._frame_start + self._budget - time.perf_counter()
+
+    async def wait_async(self, lead=0):
+        """
+        Wait until the end of the current frame's budget.
+
+        This yields to the event loop for the bulk of the wait, so that other
+        tasks can run, even if there's no time left in this frame.
+
+        """
+        await asyncio.sleep(max(0, self.remaining() - lead - self._slack))
+        self.wait(lead)
+
+    def wait(self, lead=0):
+        """
+        Wait until the end of the current frame's budget.
+
+        If a lead time in seconds is given, return that long before the end
+        of the budget instead, so that the next frame can be prepared in time
+        to be presented at the end of the budget. Either way the next frame's
+        budget starts from the end of this one.
+
+        """
+        if not self._budget:
+            self._frame_start = time.perf_counter()
+            return
+
+        deadline = self._frame_start + self._budget
+        target = deadline - min(lead, self._budget)
+        remaining = target - time.perf_counter()
+        if remaining > self._slack:
+            sleep_time = remaining - self._slack
+            before = time.perf_counter()
+            time.sleep(sleep_time)
+            overshoot = time.perf_counter() - before - sleep_time
+            self._slack = min(FrameLimiter._MAX_SLACK,
+                              max(overshoot,
+                                  self._slack * FrameLimiter._SLACK_DECAY))
+
+        while time.perf_counter() < target:
+            pass
+
+        # If we've fallen more than a whole frame behind, start afresh from
+        # now rather than rushing through frames to catch up.
+        now = time.perf_counter()
+        if now - deadline > self._budget:
+            self._frame_start = now
+        else:
+            self._frame_start = deadline
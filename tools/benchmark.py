@@ -0,0 +1,368 @@
+"""
+Headless benchmark of the time taken to run and draw each gamestate.
+
+Each scenario builds a gamestate, or a level with a single terminal program
+running, and feeds it scripted input for a number of frames under SDL's dummy
+video driver, timing each frame's run() and draw() separately. Game time
+moves on by a frame at the 60 FPS cap every frame, whatever the frames
+actually take, so that every run sees the same things happen.
+
+Each scenario is run a few times, keeping the fastest of each statistic, to
+cut down on noise from whatever else the machine is doing. The results are
+written to a JSON file. Given a baseline from an earlier run,
+the median and 90th percentile of each scenario's run and draw times are
+compared against it, and the exit status is 1 if any have regressed.
+
+Run from the root of the repository, e.g.:
+
+    python -m tools.benchmark --output new.json --baseline baseline.json
+
+"""
+
+import argparse
+import json
+import os
+import platform
+import random
+import sys
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+os.environ.setdefault('SDL_AUDIODRIVER', 'dummy')
+
+import pygame
+
+import constants
+import display
+import timer
+from gamestate import GameStateManager
+from gameplay import GameplayState
+from latency import percentile
+from menu import LevelMenu, MainMenu, SplashScreen
+
+# How far game time moves on each frame, in ms.
+_FRAME_MS = 1000 // constants.FPS
+
+# The most frames to spend waiting for a program to launch.
+_LAUNCH_FRAMES = 300
+
+_PERCENTILES = (50, 90, 99)
+
+# The percentiles compared against the baseline.
+_COMPARED = ('p50', 'p90')
+
+
+def _key(key, unicode=''):
+    """Make the events for pressing and releasing a key."""
+    return [pygame.event.Event(pygame.KEYDOWN, key=key, unicode=unicode,
+                               mod=0),
+            pygame.event.Event(pygame.KEYUP, key=key, unicode=unicode, mod=0)]
+
+
+def _type(text):
+    """Make the events for typing some text and pressing return."""
+    events = []
+    for c in text:
+        events.extend(_key(pygame.key.key_code(c) if c != ' ' else
+                           pygame.K_SPACE, c))
+    return events + _key(pygame.K_RETURN, '\r')
+
+
+def _pointer_pos(frame):
+    """Get where the pointer is on a frame, sweeping across the screen."""
+    w, h = constants.SCREEN_SIZE
+    return ((frame * 7) % w, (frame * 5) % h)
+
+
+def no_input(frame):
+    """Input for scenarios that are left alone."""
+    return []
+
+
+def pointer_input(frame):
+    """Input moving the pointer across the screen."""
+    return [pygame.event.Event(pygame.MOUSEMOTION, pos=_pointer_pos(frame),
+                               rel=(7, 5), buttons=(0, 0, 0))]
+
+
+def typing_input(frame):
+    """Input typing at the terminal, then deleting what was typed."""
+    text = 'status report'
+    step, tick = divmod(frame, 6)
+    if tick:
+        return []
+    step %= len(text) * 2
+    if step < len(text):
+        return _key(pygame.key.key_code(text[step]) if text[step] != ' '
+                    else pygame.K_SPACE, text[step])
+    return _key(pygame.K_BACKSPACE)
+
+
+def arrow_input(frame):
+    """Input moving around with the arrow keys."""
+    if frame % 15:
+        return []
+    keys = (pygame.K_RIGHT, pygame.K_DOWN, pygame.K_LEFT, pygame.K_UP)
+    return _key(keys[(frame // 15) % len(keys)])
+
+
+def flagging_input(frame):
+    """Input moving the pointer, and right clicking now and again."""
+    events = pointer_input(frame)
+    if frame % 20 == 0:
+        events.append(pygame.event.Event(pygame.MOUSEBUTTONDOWN,
+                                         pos=_pointer_pos(frame), button=3))
+    return events
+
+
+def _single_program_level(command, cls):
+    """Make a level with a single program, to launch with a command."""
+    return {'id': -1, 'time': 300,
+            'program_groups': {'benchmark': {'programs': [[command, cls]],
+                                             'program_count': 1}}}
+
+
+def _launch(mgr, state, command):
+    """Run frames until the terminal has booted, then launch a program."""
+    for _ in range(_LAUNCH_FRAMES):
+        timer.clock.advance(_FRAME_MS)
+        mgr.run(_type(command))
+        if state.active_program() is not None:
+            return
+    raise RuntimeError('Could not launch {!r}'.format(command))
+
+
+def menu_scenario(cls):
+    """Make a scenario building a menu."""
+    def build(mgr):
+        mgr.push(cls(mgr))
+    return build
+
+
+def gameplay_scenario(mgr):
+    """Build a game of the first level, at the terminal's prompt."""
+    mgr.push(GameplayState(mgr, LevelMenu.get_level(0)))
+
+
+def pause_scenario(mgr):
+    """Build a game of the first level, and pause it."""
+    mgr.push(GameplayState(mgr, LevelMenu.get_level(0)))
+    mgr.run(_key(pygame.K_ESCAPE))
+
+
+def program_scenario(command, name):
+    """Make a scenario launching a program in a level of its own."""
+    def build(mgr):
+        import programs
+        state = GameplayState(mgr, _single_program_level(
+            command, getattr(programs, name)))
+        mgr.push(state)
+        _launch(mgr, state, command)
+    return build
+
+
+# The scenarios, as (name, build function, input function) tuples. The build
+# function pushes the gamestates to measure onto a GameStateManager, and the
+# input function gives the events for each frame.
+SCENARIOS = [
+    ('SplashScreen', menu_scenario(SplashScreen), pointer_input),
+    ('MainMenu', menu_scenario(MainMenu), pointer_input),
+    ('LevelMenu', menu_scenario(LevelMenu), pointer_input),
+    ('GameplayState', gameplay_scenario, no_input),
+    ('GameplayState typing', gameplay_scenario, typing_input),
+    ('PauseMenu', pause_scenario, pointer_input),
+    ('MineHunt', program_scenario('minehunt', 'MineHunt'), flagging_input),
+    ('HardwareInspect', program_scenario('suspend', 'HardwareInspect'),
+     pointer_input),
+    ('ImagePassword', program_scenario('login', 'ImagePassword'),
+     pointer_input),
+    ('NetworkManager', program_scenario('network', 'NetworkManager'),
+     arrow_input),
+    ('HexEditor', program_scenario('hexedit', 'HexEditor'), typing_input),
+    ('Decrypt', program_scenario('decrypt', 'Decrypt'), typing_input),
+    ('PasswordGuess', program_scenario('login', 'PasswordGuess'),
+     typing_input),
+]
+
+
+def _summarize(samples):
+    """Summarize a list of times in seconds, in ms."""
+    ms = [s * 1000 for s in samples]
+    summary = {'mean': sum(ms) / len(ms), 'max': max(ms)}
+    for pct in _PERCENTILES:
+        summary['p{}'.format(pct)] = percentile(ms, pct)
+    return summary
+
+
+def _fastest(results):
+    """Combine results of the same scenario, keeping the fastest of each."""
+    return {phase: {stat: min(r[phase][stat] for r in results)
+                    for stat in results[0][phase]}
+            for phase in results[0]}
+
+
+def run_scenario(build, inputs, frames, warmup):
+    """Run a scenario, returning summaries of its run and draw times."""
+    random.seed(0)
+    mgr = GameStateManager()
+    build(mgr)
+
+    run_times = []
+    draw_times = []
+    for frame in range(warmup + frames):
+        timer.clock.advance(_FRAME_MS)
+        events = inputs(frame)
+        start = time.perf_counter()
+        mgr.run(events)
+        run_time = time.perf_counter() - start
+
+        display.current.begin_frame()
+        start = time.perf_counter()
+        mgr.draw(display.current)
+        draw_time = time.perf_counter() - start
+        display.current.present()
+
+        if frame >= warmup:
+            run_times.append(run_time)
+            draw_times.append(draw_time)
+
+    return {'run': _summarize(run_times), 'draw': _summarize(draw_times)}
+
+
+def compare(results, baseline, threshold, min_ms):
+    """
+    Compare results against a baseline.
+
+    A percentile has regressed if it's more than threshold (a fraction) and
+    min_ms slower than in the baseline. Returns the lines of a report, and
+    the number of regressions.
+
+    """
+    lines = ['{:22} {:5} {:>4} {:>9} {:>9} {:>8}'.format(
+        'scenario', 'phase', '', 'base ms', 'new ms', 'change')]
+    regressions = 0
+    base_scenarios = baseline['scenarios']
+    for name, result in results['scenarios'].items():
+        if name not in base_scenarios:
+            lines.append('{:22} not in the baseline'.format(name))
+            continue
+        for phase in ('run', 'draw'):
+            for stat in _COMPARED:
+                base = base_scenarios[name][phase][stat]
+                new = result[phase][stat]
+                change = (new - base) / base * 100 if base else 0
+                regressed = new - base > max(base * threshold, min_ms)
+                regressions += regressed
+                lines.append('{:22} {:5} {:>4} {:9.3f} {:9.3f} {:+7.1f}%{}'
+                             .format(name, phase, stat, base, new, change,
+                                     '  REGRESSED' if regressed else ''))
+    missing = [name for name in base_scenarios
+               if name not in results['scenarios']]
+    if missing:
+        lines.append('Not measured: {}'.format(', '.join(missing)))
+
+    lines.append('{} regressions over {:.0f}% and {}ms'.format(
+        regressions, threshold * 100, min_ms))
+    return lines, regressions
+
+
+def parse_args(args=None):
+    """Parse the command line arguments."""
+    parser = argparse.ArgumentParser(
+        description='Benchmark running and drawing each gamestate')
+    parser.add_argument('--frames', type=int, default=300,
+                        help='Frames to measure per scenario '
+                             '(default: %(default)s)')
+    parser.add_argument('--repeats', type=int, default=3,
+                        help='Times to run each scenario, keeping the '
+                             'fastest of each statistic '
+                             '(default: %(default)s)')
+    parser.add_argument('--warmup', type=int, default=30,
+                        help='Frames to run before measuring '
+                             '(default: %(default)s)')
+    parser.add_argument('--renderer', choices=sorted(display.BACKENDS),
+                        default='surface',
+                        help='Display backend to draw with '
+                             '(default: %(default)s)')
+    parser.add_argument('--low-spec', action='store_true',
+                        help='Draw with the low-spec profile')
+    parser.add_argument('--scenario', action='append', metavar='NAME',
+                        help='Only run this scenario, can be repeated')
+    parser.add_argument('--output', default='benchmark.json',
+                        help='File to write the results to '
+                             '(default: %(default)s)')
+    parser.add_argument('--baseline', metavar='FILE',
+                        help='Results to compare against')
+    parser.add_argument('--threshold', type=float, default=20,
+                        metavar='PERCENT',
+                        help='How much slower a percentile must be than the '
+                             'baseline to count as a regression '
+                             '(default: %(default)s)')
+    parser.add_argument('--min-ms', type=float, default=0.05,
+                        metavar='MS',
+                        help='How much slower a percentile must be to count '
+                             'as a regression, however small the baseline '
+                             '(default: %(default)s)')
+    return parser.parse_args(args)
+
+
+def main(args=None):
+    """Run the benchmarks, and compare them against a baseline if given."""
+    options = parse_args(args)
+    scenarios = [s for s in SCENARIOS
+                 if options.scenario is None or s[0] in options.scenario]
+    unknown = set(options.scenario or []) - {s[0] for s in SCENARIOS}
+    if unknown:
+        sys.exit('Unknown scenarios: {}'.format(', '.join(sorted(unknown))))
+
+    pygame.init()
+    display.init(options.renderer, low_spec=options.low_spec)
+
+    results = {
+        'environment': {
+            'python': platform.python_version(),
+            'pygame': pygame.version.ver,
+            'sdl': '.'.join(str(v) for v in pygame.get_sdl_version()),
+            'platform': platform.platform(),
+            'renderer': options.renderer,
+            'low_spec': options.low_spec,
+            'frames': options.frames,
+            'repeats': options.repeats,
+        },
+        'scenarios': {},
+    }
+    # Take turns at the scenarios, so that a slow spell on the machine
+    # doesn't land on every run of one scenario.
+    runs = {name: [] for name, _, _ in scenarios}
+    for _ in range(options.repeats):
+        for name, build, inputs in scenarios:
+            runs[name].append(run_scenario(build, inputs, options.frames,
+                                           options.warmup))
+
+    for name, _, _ in scenarios:
+        result = _fastest(runs[name])
+        results['scenarios'][name] = result
+        print('{:22} run p50 {:7.3f}ms p90 {:7.3f}ms   '
+              'draw p50 {:7.3f}ms p90 {:7.3f}ms'.format(
+                  name, result['run']['p50'], result['run']['p90'],
+                  result['draw']['p50'], result['draw']['p90']))
+
+    with open(options.output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print('Results saved to {}'.format(os.path.abspath(options.output)))
+
+    if options.baseline:
+        with open(options.baseline) as f:
+            baseline = json.load(f)
+        if baseline['environment'] != results['environment']:
+            print('Warning: the baseline was measured in a different '
+                  'environment: {}'.format(baseline['environment']))
+        lines, regressions = compare(results, baseline,
+                                     options.threshold / 100, options.min_ms)
+        print('\n'.join(lines))
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,7 +1,7 @@
 """Miscellaneous utilities for use in the game."""
 
 
-import pygame
+import display
 from resources import load_image, load_font
 
 
@@ -57,10 +57,12 @@ class ActiveEvent:
         return (self._state_mask & state) == state
 
 
-def center_align(w, h):
-    """Return coords to align an image in the center of the screen."""
-    return ((pygame.display.get_surface().get_rect().w - w) / 2,
-            (pygame.display.get_surface().get_rect().h - h) / 2)
+def center_align(w, h, rect=None):
+    """Return coords to align an image in the center of a rect or the screen."""
+    if rect is None:
+        rect = display.get_rect()
+    return (rect.x + (rect.w - w) / 2,
+            rect.y + (rect.h - h) / 2)
 
 
 def text_align(text, coords, align):
@@ -0,0 +1,150 @@
+"""
+Stall watchdog.
+
+A background thread keeps an eye on how long each frame of the game loop
+takes. Once a frame has run for longer than a threshold, the thread samples
+the game thread's stack every few ms until the frame ends. The samples are
+aggregated as collapsed stacks, one line per distinct stack with the number of
+times it was seen, which flamegraph.pl, speedscope and similar tools read.
+
+Between slow frames the thread only wakes up about once per threshold, and
+the game loop just stores the time at the start and end of each frame, so
+the watchdog is cheap enough to leave running.
+
+"""
+
+import collections
+import os
+import sys
+import threading
+import time
+
+
+class StallWatchdog:
+
+    """Thread sampling the game thread's stack during slow frames."""
+
+    # How often to sample the stack during a slow frame, in seconds.
+    _SAMPLE_INTERVAL = 0.005
+
+    def __init__(self, threshold_ms):
+        """Initialize the class, and start watching the calling thread."""
+        self._threshold = threshold_ms / 1000
+        self._thread_id = threading.get_ident()
+
+        # The start time of the frame in progress, or None between frames,
+        # and a count of the frames started. Only written by the game thread.
+        self._frame_start = None
+        self._frame_count = 0
+
+        # Collapsed stacks and the number of times each was sampled, and the
+        # number of slow frames, protected by the lock.
+        self._lock = threading.Lock()
+        self._stacks = collections.Counter()
+        self._slow_frames = 0
+
+        self._stopping = threading.Event()
+        self._thread = threading.Thread(target=self._watch, name='watchdog',
+                                        daemon=True)
+        self._thread.start()
+
+    def frame_start(self):
+        """Note that a frame has started."""
+        self._frame_count += 1
+        self._frame_start = time.perf_counter()
+
+    def frame_end(self):
+        """Note that the frame has ended."""
+        self._frame_start = None
+
+    def stop(self):
+        """Stop the watchdog thread."""
+        self._stopping.set()
+        self._thread.join()
+
+    def _watch(self):
+        """Watch for slow frames, sampling the stack during them."""
+        last_slow = None
+        while not self._stopping.is_set():
+            frame, start = self._frame_count, self._frame_start
+            if start is None:
+                wait = self._threshold
+            else:
+                wait = start + self._threshold - time.perf_counter()
+
+            if wait > 0:
+                self._stopping.wait(wait)
+                continue
+
+            stack = self._sample()
+            if (stack is None or self._frame_count != frame or
+                    self._frame_start is not start):
+                # The frame ended while we were getting the stack, so it may
+                # be of the time between frames.
+                continue
+
+            with self._lock:
+                self._stacks[stack] += 1
+                if frame != last_slow:
+                    self._slow_frames += 1
+                    last_slow = frame
+            self._stopping.wait(StallWatchdog._SAMPLE_INTERVAL)
+
+    def _sample(self):
+        """Get the game thread's current stack, collapsed into one line."""
+        frame = sys._current_frames().get(self._thread_id)
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append('{} ({}:{})'.format(
+                code.co_name, os.path.basename(code.co_filename),
+                code.co_firstlineno))
+            frame = frame.f_back
+        return ';'.join(reversed(names)) if names else None
+
+    @property
+    def slow_frames(self):
+        """The number of slow frames seen so far."""
+        with self._lock:
+            return self._slow_frames
+
+    def collapsed(self):
+        """Get the samples so far as collapsed stacks, one per line."""
+        with self._lock:
+            return ['{} {}'.format(stack, count)
+                    for stack, count in self._stacks.most_common()]
+
+    @staticmethod
+    def write(lines, filename):
+        """
+        Write collapsed stacks from collapsed() to a file.
+
+        Returns the absolute path of the file.
+
+        """
+        with open(filename, 'w') as f:
+            f.writelines(line + '\n' for line in lines)
+        return os.path.abspath(filename)
+
+    def report(self):
+        """Get a summary of the slow frames seen."""
+        with self._lock:
+            return ('Stall watchdog: {} frames over {:.0f}ms, {} samples'
+                    .format(self._slow_frames, self._threshold * 1000,
+                            sum(self._stacks.values())))
+
+
+def default_filename():
+    """Get a filename for collapsed stacks, based on the current time."""
+    return 'stalls-{}.folded'.format(time.strftime('%Y%m%d-%H%M%S'))
+
+
+"""The stall watchdog, if it has been started."""
+current = None
+
+
+def start(threshold_ms):
+    """Start watching the calling thread's frames."""
+    global current
+    current = StallWatchdog(threshold_ms)
+    return current